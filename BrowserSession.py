@@ -0,0 +1,82 @@
+import memory
+from network import attach_blocker, detach_blocker
+from payload import detach_capture
+
+
+class BrowserSession:
+    """Classe para manter o browser, o context e as páginas do scraper com a memória limitada em execuções longas
+
+    O Chromium acumula memória a cada page.goto. Entre um termo e outro, depois de recycle_cards páginas
+    carregadas (contadas pelo evento domcontentloaded: cards com sucesso ou falha e os feeds) ou
+    quando o RSS do browser passa de recycle_rss_mb, o context e suas páginas são fechados e recriados (o
+    browser inteiro também, com recycle_browser). O storage_state (cookies do consentimento) passa para o
+    context novo, então o recycle não volta à tela de consentimento. O modo --list-only não abre páginas de
+    detalhes e só conta os feeds. Zero desativa cada limite."""
+
+    def __init__(self, playwright, workers=1, block_profile='default', recycle_cards=0, recycle_rss_mb=0, recycle_browser=False):
+        self.playwright = playwright
+        self.workers = max(workers, 1)
+        self.block_profile = block_profile
+        self.recycle_cards = recycle_cards
+        self.recycle_rss_mb = recycle_rss_mb
+        self.recycle_browser = recycle_browser
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.detail_pages = []
+        self.page_loads = 0
+        self.recycles = 0
+
+    async def start(self, storage_state=None):
+        if self.browser is None: self.browser = await self.playwright.chromium.launch(headless=True)
+        self.context = await self.browser.new_context(storage_state=storage_state)
+        self.page = await self.context.new_page()
+        self.detail_pages = [self.page] + [await self.context.new_page() for _ in range(self.workers - 1)]
+        for detail_page in self.detail_pages:
+            await attach_blocker(detail_page, self.block_profile)
+            detail_page.on('domcontentloaded', self._count_load)
+        self.page_loads = 0
+        return self
+
+    def _count_load(self, page):
+        self.page_loads += 1
+
+    async def _close_context(self):
+        # Guarda o estado antes de fechar, o context novo começa com os mesmos cookies
+        try: storage_state = await self.context.storage_state()
+        except Exception: storage_state = None
+
+        for detail_page in self.detail_pages:
+            detach_blocker(detail_page)
+            detach_capture(detail_page)
+        await self.context.close()
+        self.context, self.page, self.detail_pages = None, None, []
+        return storage_state
+
+    async def recycle(self, reason):
+        """Recria o context e as páginas (e o browser com recycle_browser) mantendo o storage_state"""
+        before = memory.record_rss()
+        storage_state = await self._close_context()
+        if self.recycle_browser:
+            await self.browser.close()
+            self.browser = None
+
+        await self.start(storage_state)
+        self.recycles += 1
+        after = memory.record_rss()
+        print(f"Recycled {'browser' if self.recycle_browser else 'context'} ({reason}): {memory.describe_rss(*before)} -> {memory.describe_rss(*after)}")
+
+    async def after_term(self):
+        """Recicla quando algum limite foi atingido, as páginas carregadas contam mesmo em termos que falharam.
+        Só é chamado entre termos, quando nenhuma página está em uso"""
+        _, browser_mb = memory.record_rss()
+
+        if self.recycle_cards and self.page_loads >= self.recycle_cards:
+            await self.recycle(f'{self.page_loads} page loads')
+        elif self.recycle_rss_mb and browser_mb is not None and browser_mb >= self.recycle_rss_mb:
+            await self.recycle(f'browser RSS {browser_mb:.0f} MB')
+
+    async def close(self):
+        if self.context: await self._close_context()
+        if self.browser: await self.browser.close()
+        self.browser = None
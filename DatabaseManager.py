@@ -1,17 +1,28 @@
 import sqlite3
+from contextlib import contextmanager
+from geo import bounding_box, distance_meters
+from parsers import parse_place_id
+import metrics
 
 
 class DatabaseManager:
     """Classe para gerenciar interações com o banco de dados SQLite"""
 
-    def __init__(self, db_path="products.db"):
+    def __init__(self, db_path="products.db", persistent=False, journal_mode="WAL", synchronous="NORMAL"):
         self.db_path = db_path
+        self.persistent = persistent  # Mantém uma única conexão aberta entre as chamadas
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
         self.connection = None
+        self._transaction_depth = 0
+        self._open_iterators = 0
+        self.spatial_index = False
         self._create_database()
 
     def _create_database(self):
         """Cria o banco de dados e a tabela se não existirem"""
         conn = sqlite3.connect(self.db_path)
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -31,17 +42,123 @@ class DatabaseManager:
                 address TEXT,
                 stars INTEGER,
                 price TEXT,
-                card_href TEXT
+                card_href TEXT,
+                scraped_at TEXT,
+                place_id TEXT,
+                category TEXT,
+                partial INTEGER NOT NULL DEFAULT 0,
+                checked_at TEXT,
+                check_failures INTEGER NOT NULL DEFAULT 0
             )
         ''')
 
+        added = self._add_missing_columns(cursor, {
+            'scraped_at': 'TEXT', 'place_id': 'TEXT', 'category': 'TEXT', 'partial': 'INTEGER NOT NULL DEFAULT 0',
+            'checked_at': 'TEXT', 'check_failures': 'INTEGER NOT NULL DEFAULT 0'
+        })
+        if 'checked_at' in added:
+            # Registros completos anteriores à coluna foram verificados pela última vez quando foram raspados
+            cursor.execute("UPDATE products SET checked_at = scraped_at WHERE partial = 0")
+        self._create_indexes(cursor)
+        self._create_spatial_index(cursor)
+
         conn.commit()
         conn.close()
 
+    def _add_missing_columns(self, cursor, columns):
+        """Adiciona colunas novas em bancos criados antes delas existirem, retorna as colunas adicionadas"""
+        existing = [row[1] for row in cursor.execute("PRAGMA table_info(products)").fetchall()]
+        added = []
+        for column, definition in columns.items():
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE products ADD COLUMN {column} {definition}")
+                added.append(column)
+        return added
+
+    def _create_indexes(self, cursor):
+        """Cria a chave única da identidade do local e os índices secundários"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_products_place'"
+        ).fetchone()
+
+        if not exists:
+            # Preenche o place_id dos registros antigos, apenas o mais recente de cada local fica com a chave
+            rows = cursor.execute(
+                "SELECT id, product_type, card_href FROM products WHERE place_id IS NULL ORDER BY id DESC"
+            ).fetchall()
+            taken = set(cursor.execute(
+                "SELECT place_id, product_type FROM products WHERE place_id IS NOT NULL"
+            ).fetchall())
+
+            backfill = []
+            for record_id, product_type, card_href in rows:
+                place_id = parse_place_id(card_href)
+                if place_id is None or (place_id, product_type) in taken: continue
+                taken.add((place_id, product_type))
+                backfill.append((place_id, record_id))
+
+            cursor.executemany("UPDATE products SET place_id = ? WHERE id = ?", backfill)
+            cursor.execute("CREATE UNIQUE INDEX idx_products_place ON products(place_id, product_type)")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_product_type ON products(product_type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_card_href ON products(card_href)")
+        # Índice parcial, só contém os registros do modo --list-only que ainda esperam a página de detalhes
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_partial ON products(product_type) WHERE partial = 1")
+        # Ordem de prioridade do modo --refresh, os nunca verificados (NULL) vêm primeiro
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_checked ON products(checked_at)")
+
+    def _create_spatial_index(self, cursor):
+        """Cria o índice R*Tree das coordenadas, mantido em sincronia com products por triggers.
+        Sem o módulo rtree no SQLite, find_nearby usa o índice comum de latitude"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_lat_lon ON products(latitude, longitude)")
+        try:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_rtree'"
+            ).fetchone()
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS products_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+            )
+        except sqlite3.OperationalError as e:
+            print(f"Spatial index not available, using the latitude index: {str(e)}")
+            return
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_rtree_insert AFTER INSERT ON products
+            WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL
+            BEGIN
+                INSERT OR REPLACE INTO products_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_rtree_update AFTER UPDATE OF latitude, longitude ON products
+            BEGIN
+                DELETE FROM products_rtree WHERE id = old.id;
+                INSERT INTO products_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+                WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS products_rtree_delete AFTER DELETE ON products
+            BEGIN
+                DELETE FROM products_rtree WHERE id = old.id;
+            END
+        ''')
+
+        # Bancos criados antes do índice recebem as coordenadas já gravadas
+        if not exists:
+            cursor.execute(
+                "INSERT INTO products_rtree SELECT id, latitude, latitude, longitude, longitude FROM products "
+                "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+            )
+        self.spatial_index = True
+
     def connect(self):
-        """Inicia a conexão com o banco de dados"""
+        """Inicia a conexão com o banco de dados, reaproveitando a conexão já aberta"""
+        if self.connection: return
+
         self.connection = sqlite3.connect(self.db_path)
         self.connection.row_factory = sqlite3.Row  # Para retornar resultados como dicionário
+        self.connection.execute(f"PRAGMA synchronous={self.synchronous}")
 
     def disconnect(self):
         """Encerra a conexão com o banco de dados"""
@@ -49,6 +166,44 @@ class DatabaseManager:
             self.connection.close()
             self.connection = None
 
+    def close(self):
+        """Encerra a conexão persistente"""
+        self.disconnect()
+
+    def _release(self):
+        """Fecha a conexão ao fim de cada chamada, exceto no modo persistente, dentro de uma transação
+        ou enquanto um iter_query ainda está lendo"""
+        if not self.persistent and not self._transaction_depth and not self._open_iterators:
+            self.disconnect()
+
+    def _commit(self):
+        """Dentro de uma transação o commit fica para o fim do bloco"""
+        if not self._transaction_depth:
+            self.connection.commit()
+
+    def _rollback(self, error):
+        """Desfaz a escrita parcial de uma chamada que falhou, para que o próximo commit não a grave.
+        Dentro de uma transação relança o erro e transaction() desfaz o bloco inteiro"""
+        if self._transaction_depth: raise error
+        self.connection.rollback()
+
+    @contextmanager
+    def transaction(self):
+        """Agrupa todas as escritas do bloco em um único commit"""
+        self.connect()
+        self._transaction_depth += 1
+        try:
+            yield self
+        except Exception:
+            self._transaction_depth -= 1
+            if not self._transaction_depth: self.connection.rollback()
+            raise
+        else:
+            self._transaction_depth -= 1
+            if not self._transaction_depth: self.connection.commit()
+        finally:
+            self._release()
+
     def get(self, sql_statement, params=None):
         """Executa uma query SQL no banco de dados"""
         self.connect()
@@ -66,7 +221,99 @@ class DatabaseManager:
             print(f"Error executing query: {str(e)}")
             return []
         finally:
-            self.disconnect()
+            self._release()
+
+    def iter_query(self, sql_statement, params=None, chunk_size=1000):
+        """Executa uma query SQL e devolve os registros um a um, lendo chunk_size por vez com fetchmany
+        para não carregar o resultado inteiro na memória"""
+        self.connect()
+        self._open_iterators += 1
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(sql_statement, params or [])
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows: break
+                for row in rows:
+                    yield dict(row)
+
+        except sqlite3.Error as e:
+            print(f"Error executing query: {str(e)}")
+        finally:
+            cursor.close()
+            self._open_iterators -= 1
+            self._release()
+
+    def iter_chunks(self, sql_statement, params=None, chunk_size=1000):
+        """Como iter_query, mas devolve listas de até chunk_size registros"""
+        chunk = []
+        for row in self.iter_query(sql_statement, params, chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk: yield chunk
+
+    def iter_pages(self, sql_statement, params=None, chunk_size=1000):
+        """Como iter_query, mas cada bloco é uma query nova paginada por id > último id lido (sql_statement
+        sem ORDER BY/LIMIT e com a coluna id). Nenhum cursor fica aberto entre os blocos, então um writer em
+        outra conexão não prende o checkpoint do WAL durante uma leitura longa"""
+        last_id = 0
+        while True:
+            rows = self.get(
+                f"SELECT * FROM ({sql_statement}) WHERE id > ? ORDER BY id LIMIT ?",
+                list(params or []) + [last_id, chunk_size]
+            )
+            if not rows: break
+            yield from rows
+            last_id = rows[-1]['id']
+
+    def find_nearby(self, latitude, longitude, radius_m, product_type=None):
+        """Busca os registros a até radius_m metros da coordenada pelo índice espacial,
+        retorna os registros ordenados pela distância (campo distance, em metros)"""
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_m)
+        if self.spatial_index:
+            # CROSS JOIN força o SQLite a partir do R*Tree, e não do índice de product_type
+            sql = (
+                "SELECT p.* FROM products_rtree r CROSS JOIN products p ON p.id = r.id "
+                "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?"
+            )
+        else:
+            sql = (
+                "SELECT p.* FROM products p INDEXED BY idx_products_lat_lon "
+                "WHERE p.latitude >= ? AND p.latitude <= ? AND p.longitude >= ? AND p.longitude <= ?"
+            )
+        params = [min_lat, max_lat, min_lon, max_lon]
+        if product_type:
+            sql += " AND p.product_type = ?"
+            params.append(product_type)
+
+        # A caixa do índice é um quadrado (e o R*Tree guarda floats de 32 bits), a distância real filtra o resultado
+        nearby = []
+        for row in self.get(sql, params):
+            row['distance'] = distance_meters(latitude, longitude, row['latitude'], row['longitude'])
+            if row['distance'] <= radius_m: nearby.append(row)
+
+        return sorted(nearby, key=lambda row: row['distance'])
+
+    def execute(self, sql_statement, params=None, many=False):
+        """Executa um statement de escrita (ou executemany com many=True), retorna as linhas afetadas"""
+        self.connect()
+        try:
+            cursor = self.connection.cursor()
+            if many: cursor.executemany(sql_statement, params or [])
+            elif params: cursor.execute(sql_statement, params)
+            else: cursor.execute(sql_statement)
+
+            self._commit()
+            return cursor.rowcount
+
+        except Exception as e:
+            self._rollback(e)
+            print(f"Error executing statement: {str(e)}")
+            return 0
+        finally:
+            self._release()
 
     def create(self, data):
         """Insere um novo registro no banco de dados"""
@@ -81,14 +328,15 @@ class DatabaseManager:
             sql = f"INSERT INTO products ({fields}) VALUES ({placeholders})"
             cursor.execute(sql, list(data.values()))
 
-            self.connection.commit()
+            self._commit()
             return cursor.lastrowid
 
         except Exception as e:
+            self._rollback(e)
             print(f"Error creating record: {str(e)}")
             return None
         finally:
-            self.disconnect()
+            self._release()
 
     def update(self, record_id, data):
         """Atualiza um registro existente no banco de dados"""
@@ -103,14 +351,115 @@ class DatabaseManager:
             params = list(data.values()) + [record_id]
             cursor.execute(sql, params)
 
-            self.connection.commit()
+            self._commit()
             return cursor.rowcount > 0  # Retorna True se alguma linha foi afetada
 
         except Exception as e:
+            self._rollback(e)
             print(f"Error updating record: {str(e)}")
             return False
         finally:
-            self.disconnect()
+            self._release()
+
+    def upsert(self, data):
+        """Insere ou atualiza o registro pela identidade do local (place_id, product_type) em um único statement.
+        Uma descrição vazia nunca sobrescreve a existente e um registro parcial nunca rebaixa um completo.
+        Retorna (record_id, created)"""
+        data = dict(data)
+        if not data.get('place_id'): data['place_id'] = parse_place_id(data.get('card_href'))
+
+        self.connect()
+        try:
+            cursor = self.connection.cursor()
+
+            # Busca pela chave única (indexada) apenas para saber se o registro é novo
+            with metrics.timer('db_lookup_seconds'):
+                existing = cursor.execute(
+                    "SELECT id FROM products WHERE place_id = ? AND product_type = ?",
+                    (data['place_id'], data.get('product_type'))
+                ).fetchone()
+
+            fields = ', '.join(data.keys())
+            placeholders = ', '.join(['?' for _ in data.values()])
+            updates = [f"{key} = excluded.{key}" for key in data.keys() if key not in ('description', 'partial', 'place_id', 'product_type')]
+            if 'description' in data:
+                updates.append("description = COALESCE(NULLIF(excluded.description, ''), products.description)")
+            if 'partial' in data:
+                updates.append("partial = MIN(products.partial, excluded.partial)")
+
+            sql = (
+                f"INSERT INTO products ({fields}) VALUES ({placeholders}) "
+                f"ON CONFLICT(place_id, product_type) DO UPDATE SET {', '.join(updates)}"
+            )
+            with metrics.timer('db_write_seconds'):
+                cursor.execute(sql, list(data.values()))
+                self._commit()
+
+            if existing: return existing[0], False
+            return cursor.lastrowid, True
+
+        except Exception as e:
+            self._rollback(e)
+            print(f"Error upserting record: {str(e)}")
+            return None, False
+        finally:
+            self._release()
+
+    def create_many(self, rows):
+        """Insere vários registros com executemany, retorna a quantidade inserida"""
+        if not rows: return 0
+
+        self.connect()
+        try:
+            cursor = self.connection.cursor()
+
+            # Agrupa os registros pelo conjunto de campos para montar uma query por grupo
+            groups = {}
+            for data in rows:
+                groups.setdefault(tuple(data.keys()), []).append(list(data.values()))
+
+            for keys, values in groups.items():
+                fields = ', '.join(keys)
+                placeholders = ', '.join(['?' for _ in keys])
+                cursor.executemany(f"INSERT INTO products ({fields}) VALUES ({placeholders})", values)
+
+            self._commit()
+            return len(rows)
+
+        except Exception as e:
+            self._rollback(e)
+            print(f"Error creating records: {str(e)}")
+            return 0
+        finally:
+            self._release()
+
+    def update_many(self, items):
+        """Atualiza vários registros, recebe uma lista de (record_id, data)"""
+        if not items: return 0
+
+        self.connect()
+        try:
+            cursor = self.connection.cursor()
+
+            groups = {}
+            for record_id, data in items:
+                groups.setdefault(tuple(data.keys()), []).append(list(data.values()) + [record_id])
+
+            updated = 0
+            for keys, params in groups.items():
+                set_clause = ', '.join([f"{key} = ?" for key in keys])
+                cursor.executemany(f"UPDATE products SET {set_clause} WHERE id = ?", params)
+                updated += cursor.rowcount
+
+            self._commit()
+            return updated
+
+        except Exception as e:
+            self._rollback(e)
+            print(f"Error updating records: {str(e)}")
+            return 0
+        finally:
+            self._release()
 
     def destroy(self, record_id):
         """Remove um registro do banco de dados"""
@@ -119,11 +468,12 @@ class DatabaseManager:
             cursor = self.connection.cursor()
             cursor.execute("DELETE FROM products WHERE id = ?", (record_id,))
 
-            self.connection.commit()
+            self._commit()
             return cursor.rowcount > 0  # Retorna True se alguma linha foi removida
 
         except Exception as e:
+            self._rollback(e)
             print(f"Error deleting record: {str(e)}")
             return False
         finally:
-            self.disconnect()
\ No newline at end of file
+            self._release()
\ No newline at end of file
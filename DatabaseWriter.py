@@ -0,0 +1,103 @@
+import asyncio
+import queue
+import threading
+from DatabaseManager import DatabaseManager
+
+
+class DatabaseWriter:
+    """Classe para gravar no SQLite fora do event loop (write-behind)
+
+    O código assíncrono enfileira as escritas com submit e segue o scraping. Uma thread dedicada, dona da
+    sua própria conexão, executa até batch_size escritas por transação e devolve o resultado de cada uma
+    em um future do event loop. Com max_pending escritas na fila o submit espera (backpressure) e o
+    close grava tudo o que ainda estiver na fila antes de encerrar, inclusive após um Ctrl-C."""
+
+    def __init__(self, db_path="products.db", journal_mode="WAL", batch_size=200, max_pending=1000):
+        self.db_path = db_path
+        self.journal_mode = journal_mode
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.SimpleQueue()
+        self._pending = set()
+        self._loop = None
+        self._slots = None
+        self._thread = None
+
+    def start(self):
+        """Inicia a thread de escrita, deve ser chamado dentro do event loop que vai usar o writer"""
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name='db-writer')
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _run(self, ready):
+        db = DatabaseManager(self.db_path, persistent=True, journal_mode=self.journal_mode)
+        ready.set()
+
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try: batch.append(self._queue.get_nowait())
+                except queue.Empty: break
+
+            results = []
+            try:
+                with db.transaction():
+                    for item in batch:
+                        if item is None:
+                            stop = True
+                            continue
+
+                        operation, args, future = item
+                        try: results.append((future, operation(db, *args), None))
+                        except Exception as e: results.append((future, None, e))
+            except Exception as e:
+                # O commit falhou, nenhuma escrita do lote foi gravada
+                results = [(future, None, e) for future, _, _ in results]
+
+            self.batches += 1
+            self.writes += len(results)
+            for future, result, error in results:
+                self._resolve(future, result, error)
+
+        db.close()
+
+    def _resolve(self, future, result, error):
+        def done():
+            self._slots.release()
+            if future.cancelled(): return
+            if error is not None: future.set_exception(error)
+            else: future.set_result(result)
+
+        # Após um Ctrl-C o event loop pode já estar fechado, a escrita foi gravada de qualquer forma
+        try: self._loop.call_soon_threadsafe(done)
+        except RuntimeError: pass
+
+    async def submit(self, operation, *args):
+        """Enfileira operation(db, *args) para a thread de escrita e retorna um future com o resultado.
+        Só espera quando já existem max_pending escritas na fila"""
+        await self._slots.acquire()
+        future = self._loop.create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        self._queue.put((operation, args, future))
+        return future
+
+    async def drain(self):
+        """Espera todas as escritas enfileiradas até agora serem gravadas"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def close(self):
+        """Grava o que estiver na fila e encerra a thread, seguro para chamar em um finally"""
+        if not self._thread: return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        print(f"DB writer: {self.writes} writes in {self.batches} transactions")
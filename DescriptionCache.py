@@ -0,0 +1,107 @@
+import time
+from parsers import parse_place_id
+
+
+class DescriptionCache:
+    """Classe para guardar as descrições geradas por IA e evitar pagar pela mesma geração novamente
+
+    As descrições são indexadas pelo place_id (extraído do card_href) e pela versão do prompt/modelo,
+    expiram após ttl_days e as menos usadas são removidas quando o cache passa de max_entries."""
+
+    def __init__(self, db, version, ttl_days=90, max_entries=200000):
+        self.db = db
+        self.version = version
+        self.ttl_days = ttl_days
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._create_table()
+
+    def _create_table(self):
+        """Cria a tabela do cache se não existir"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS description_cache (
+                place_id TEXT NOT NULL,
+                version TEXT NOT NULL,
+                description TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                last_used_at TEXT NOT NULL,
+                PRIMARY KEY (place_id, version)
+            )
+        ''')
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_description_cache_used ON description_cache(last_used_at)")
+
+    def _now(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+    def evict(self):
+        """Remove as entradas expiradas e as menos usadas acima do limite de entradas"""
+        with self.db.transaction():
+            self.db.execute(
+                "DELETE FROM description_cache WHERE created_at < datetime('now', ?)",
+                (f'-{self.ttl_days} days',)
+            )
+            self.db.execute(
+                "DELETE FROM description_cache WHERE rowid NOT IN "
+                "(SELECT rowid FROM description_cache ORDER BY last_used_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def get(self, card_href, touch=True):
+        """Retorna a descrição em cache do local ou None"""
+        return self.get_many([card_href], touch).get(card_href)
+
+    def get_many(self, card_hrefs, touch=True):
+        """Busca várias descrições de uma vez, retorna um dicionário card_href -> descrição.
+        Com touch=False quem chama atualiza o last_used_at depois, com o método touch"""
+        place_ids = {}
+        for href in card_hrefs:
+            place_id = parse_place_id(href)
+            if place_id: place_ids.setdefault(place_id, []).append(href)
+
+        found = {}
+        ids = list(place_ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ', '.join(['?' for _ in chunk])
+            rows = self.db.get(
+                f"SELECT place_id, description FROM description_cache WHERE version=? "
+                f"AND created_at >= datetime('now', ?) AND place_id IN ({placeholders})",
+                [self.version, f'-{self.ttl_days} days', *chunk]
+            )
+            for row in rows:
+                for href in place_ids[row['place_id']]: found[href] = row['description']
+
+        if found and touch: self.touch(found)
+
+        self.hits += len(found)
+        self.misses += len([href for href in card_hrefs if href not in found])
+        return found
+
+    def touch(self, card_hrefs, db=None):
+        """Atualiza o last_used_at das descrições usadas, db permite gravar pela conexão do DatabaseWriter"""
+        used = {parse_place_id(href) for href in card_hrefs}
+        (db or self.db).execute(
+            "UPDATE description_cache SET last_used_at=? WHERE version=? AND place_id=?",
+            [(self._now(), self.version, place_id) for place_id in used if place_id], many=True
+        )
+
+    def put(self, card_href, description):
+        self.put_many({card_href: description})
+
+    def put_many(self, descriptions):
+        """Guarda várias descrições, recebe um dicionário card_href -> descrição"""
+        now = self._now()
+        rows = [
+            (parse_place_id(href), self.version, description, now, now)
+            for href, description in descriptions.items() if parse_place_id(href) and description
+        ]
+        self.db.execute(
+            "INSERT OR REPLACE INTO description_cache (place_id, version, description, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+            rows, many=True
+        )
+
+    def print_stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        print(f"Description cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)")
@@ -0,0 +1,281 @@
+import time
+
+
+class JobManager:
+    """Classe para registrar o progresso do scraping na tabela jobs e retomar execuções interrompidas
+
+    Cada termo de busca de um product_type/location é um job (card_href vazio) e cada card
+    coletado no feed desse termo é um job filho com o card_href preenchido.
+
+    Com um worker_id a classe também distribui os jobs de termo entre várias máquinas que
+    compartilham o mesmo arquivo SQLite: cada worker reserva um termo com um lease de tempo
+    limitado, renova o lease enquanto trabalha e reserva cada local logo antes de visitá-lo.
+    A reserva do local fica presa ao job do termo: as ainda não visitadas são apagadas quando o
+    termo é devolvido ou reservado de novo após o lease expirar.
+
+    start, finish, visited_place e release_place recebem opcionalmente a conexão da thread do
+    DatabaseWriter, assim o scraper grava esses status fora do event loop."""
+
+    MAX_ATTEMPTS = 3
+    UNFINISHED = ('pending', 'running', 'collected', 'failed')
+    CLAIMABLE = ('pending', 'collected', 'failed')
+
+    def __init__(self, db, worker_id=None):
+        self.db = db
+        self.worker_id = worker_id
+        self._create_table()
+
+    def _create_table(self):
+        """Cria a tabela jobs e seus índices se não existirem"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_type TEXT NOT NULL,
+                location TEXT NOT NULL,
+                search_term TEXT NOT NULL,
+                card_href TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT
+            )
+        ''')
+        self.db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_unit ON jobs(product_type, location, search_term, card_href)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+        existing = [row['name'] for row in self.db.get("PRAGMA table_info(jobs)")]
+        for column, definition in {'worker_id': 'TEXT', 'lease_until': 'REAL', 'mode': 'TEXT'}.items():
+            if column not in existing:
+                self.db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS place_claims (
+                product_type TEXT NOT NULL,
+                place_id TEXT NOT NULL,
+                worker_id TEXT,
+                claimed_at TEXT,
+                job_id INTEGER,
+                visited INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (product_type, place_id)
+            )
+        ''')
+
+        existing = [row['name'] for row in self.db.get("PRAGMA table_info(place_claims)")]
+        for column, definition in {'job_id': 'INTEGER', 'visited': 'INTEGER NOT NULL DEFAULT 0'}.items():
+            if column not in existing:
+                self.db.execute(f"ALTER TABLE place_claims ADD COLUMN {column} {definition}")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_place_claims_job ON place_claims(job_id)")
+
+    def _now(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+    def enqueue_terms(self, product_type, location, search_terms, mode='full'):
+        """Registra um job por termo de busca com o modo da execução ('full' ou 'list-only'), termos já
+        registrados são mantidos como estão"""
+        now = self._now()
+        self.db.execute(
+            "INSERT OR IGNORE INTO jobs (product_type, location, search_term, updated_at, mode) VALUES (?, ?, ?, ?, ?)",
+            [(product_type, location, term, now, mode) for term in search_terms], many=True
+        )
+
+    def run_mode(self, product_type, location):
+        """Retorna o modo da execução registrada para o product_type/location, None quando não há jobs.
+        Jobs anteriores à coluna mode são de execuções completas"""
+        rows = self.db.get(
+            "SELECT COALESCE(mode, 'full') AS mode FROM jobs WHERE product_type=? AND location=? AND card_href='' LIMIT 1",
+            (product_type, location)
+        )
+        return rows[0]['mode'] if rows else None
+
+    def unfinished_terms(self, product_type, location):
+        """Retorna os jobs de termo que ainda não foram concluídos, na ordem em que foram registrados"""
+        placeholders = ', '.join(['?' for _ in self.UNFINISHED])
+        return self.db.get(
+            f"SELECT * FROM jobs WHERE product_type=? AND location=? AND card_href='' "
+            f"AND status IN ({placeholders}) AND attempts < ? ORDER BY id",
+            [product_type, location, *self.UNFINISHED, self.MAX_ATTEMPTS]
+        )
+
+    def term_job(self, product_type, location, search_term):
+        rows = self.db.get(
+            "SELECT * FROM jobs WHERE product_type=? AND location=? AND search_term=? AND card_href=''",
+            (product_type, location, search_term)
+        )
+        return rows[0] if rows else None
+
+    def reopen_failed_terms(self, product_type, location):
+        """Volta para 'collected' os termos concluídos que têm cards com falha e tentativas restantes, assim
+        a próxima execução só tenta esses cards de novo (sem recarregar o feed). Retorna os termos reabertos"""
+        # O job do próprio termo também precisa de tentativas, um termo reaberto sem elas não seria retomado
+        failed = self.db.get(
+            "SELECT DISTINCT card.search_term FROM jobs card JOIN jobs term ON term.product_type=card.product_type "
+            "AND term.location=card.location AND term.search_term=card.search_term AND term.card_href='' "
+            "WHERE card.product_type=? AND card.location=? AND card.card_href!='' AND card.status='failed' "
+            "AND card.attempts < ? AND term.status='done' AND term.attempts < ?",
+            (product_type, location, self.MAX_ATTEMPTS, self.MAX_ATTEMPTS)
+        )
+        terms = [row['search_term'] for row in failed]
+        self.db.execute(
+            "UPDATE jobs SET status='collected', updated_at=? WHERE product_type=? AND location=? AND search_term=? "
+            "AND card_href='' AND status='done'",
+            [(self._now(), product_type, location, term) for term in terms], many=True
+        )
+        return terms
+
+    def done_places(self, product_type, location):
+        """card_href dos cards já concluídos neste product_type/location, usados para não revisitá-los ao retomar"""
+        return [row['card_href'] for row in self.db.get(
+            "SELECT card_href FROM jobs WHERE product_type=? AND location=? AND card_href!='' AND status='done'",
+            (product_type, location)
+        )]
+
+    def reset(self, product_type, location):
+        """Remove os jobs de um product_type/location para começar uma nova execução do zero"""
+        self.db.execute("DELETE FROM jobs WHERE product_type=? AND location=?", (product_type, location))
+
+    def enqueue_cards(self, product_type, location, search_term, card_hrefs):
+        """Registra os cards coletados no feed do termo e marca o termo como coletado.
+        Retorna um dicionário card_href -> job id"""
+        now = self._now()
+        with self.db.transaction():
+            self.db.execute(
+                "INSERT OR IGNORE INTO jobs (product_type, location, search_term, card_href, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(product_type, location, search_term, href, now) for href in card_hrefs if href], many=True
+            )
+            self.db.execute(
+                "UPDATE jobs SET status='collected', updated_at=? WHERE product_type=? AND location=? AND search_term=? AND card_href=''",
+                (now, product_type, location, search_term)
+            )
+
+        return {row['card_href']: row['id'] for row in self.card_jobs(product_type, location, search_term)}
+
+    def card_jobs(self, product_type, location, search_term, unfinished_only=False):
+        sql = "SELECT * FROM jobs WHERE product_type=? AND location=? AND search_term=? AND card_href!=''"
+        params = [product_type, location, search_term]
+        if unfinished_only:
+            placeholders = ', '.join(['?' for _ in self.UNFINISHED])
+            sql += f" AND status IN ({placeholders}) AND attempts < ?"
+            params += [*self.UNFINISHED, self.MAX_ATTEMPTS]
+
+        return self.db.get(sql + " ORDER BY id", params)
+
+    def start(self, job_id, db=None):
+        """Marca o job como em execução e contabiliza a tentativa"""
+        (db or self.db).execute(
+            "UPDATE jobs SET status='running', attempts=attempts + 1, updated_at=? WHERE id=?",
+            (self._now(), job_id)
+        )
+
+    def finish(self, job_id, status='done', db=None):
+        """Finaliza o job com o status informado (done, skipped ou failed)"""
+        (db or self.db).execute("UPDATE jobs SET status=?, updated_at=? WHERE id=?", (status, self._now(), job_id))
+
+    def claim_term(self, lease_seconds):
+        """Reserva o próximo job de termo livre (ou com lease expirado) para este worker, retorna o job ou None"""
+        now = time.time()
+        placeholders = ', '.join(['?' for _ in self.CLAIMABLE])
+        claimable = (
+            f"card_href='' AND attempts < ? AND "
+            f"(status IN ({placeholders}) OR (status='running' AND COALESCE(lease_until, 0) < ?))"
+        )
+        params = [self.MAX_ATTEMPTS, *self.CLAIMABLE, now]
+
+        for candidate in self.db.get(f"SELECT id FROM jobs WHERE {claimable} ORDER BY id LIMIT 20", params):
+            # O UPDATE repete as condições, apenas um worker consegue reservar cada job
+            claimed = self.db.execute(
+                f"UPDATE jobs SET status='running', worker_id=?, lease_until=?, updated_at=? WHERE id=? AND {claimable}",
+                [self.worker_id, now + lease_seconds, self._now(), candidate['id'], *params]
+            )
+            if claimed:
+                # Locais reservados e não visitados pelo dono anterior (lease expirado) voltam a ficar livres
+                self.db.execute("DELETE FROM place_claims WHERE job_id=? AND visited=0", (candidate['id'],))
+                return self.db.get("SELECT * FROM jobs WHERE id=?", (candidate['id'],))[0]
+
+        return None
+
+    def renew(self, job_id, lease_seconds):
+        """Heartbeat: estende o lease do job, retorna False se o lease foi perdido para outro worker"""
+        return self.db.execute(
+            "UPDATE jobs SET lease_until=?, updated_at=? WHERE id=? AND worker_id=? AND status='running'",
+            (time.time() + lease_seconds, self._now(), job_id, self.worker_id)
+        ) > 0
+
+    def release(self, job_id):
+        """Devolve o job para a fila após uma falha do worker, junto com os locais que ele não chegou a visitar"""
+        self.db.execute(
+            "UPDATE jobs SET status='pending', worker_id=NULL, lease_until=NULL, updated_at=? WHERE id=? AND worker_id=?",
+            (self._now(), job_id, self.worker_id)
+        )
+        self.release_places(job_id)
+
+    def release_places(self, job_id):
+        """Apaga as reservas deste worker ainda não visitadas no job do termo (falha ou lease perdido)"""
+        self.db.execute(
+            "DELETE FROM place_claims WHERE job_id=? AND worker_id=? AND visited=0",
+            (job_id, self.worker_id)
+        )
+
+    def has_unfinished_terms(self):
+        placeholders = ', '.join(['?' for _ in self.UNFINISHED])
+        return len(self.db.get(
+            f"SELECT id FROM jobs WHERE card_href='' AND status IN ({placeholders}) AND attempts < ? LIMIT 1",
+            [*self.UNFINISHED, self.MAX_ATTEMPTS]
+        )) > 0
+
+    def claim_place(self, product_type, place_id, job_id=None):
+        """Reserva a visita de um local entre todos os workers, retorna False se outro worker já o reservou.
+        job_id é o job do termo cujo lease cobre a visita"""
+        return self.db.execute(
+            "INSERT OR IGNORE INTO place_claims (product_type, place_id, worker_id, claimed_at, job_id) VALUES (?, ?, ?, ?, ?)",
+            (product_type, place_id, self.worker_id, self._now(), job_id)
+        ) > 0
+
+    def visited_place(self, product_type, place_id, db=None):
+        """Marca a reserva como visitada, ela não é mais apagada quando o termo é devolvido"""
+        (db or self.db).execute(
+            "UPDATE place_claims SET visited=1 WHERE product_type=? AND place_id=? AND worker_id=?",
+            (product_type, place_id, self.worker_id)
+        )
+
+    def release_place(self, product_type, place_id, db=None):
+        """Libera a reserva de um local cuja visita falhou para que outro termo possa tentar novamente"""
+        (db or self.db).execute(
+            "DELETE FROM place_claims WHERE product_type=? AND place_id=? AND worker_id=?",
+            (product_type, place_id, self.worker_id)
+        )
+
+    def clear_place_claims(self, product_type):
+        self.db.execute("DELETE FROM place_claims WHERE product_type=?", (product_type,))
+
+    def summary(self, product_type=None, location=None):
+        """Retorna a contagem de jobs por product_type/location, tipo (term/card) e status"""
+        sql = (
+            "SELECT product_type, location, CASE WHEN card_href='' THEN 'term' ELSE 'card' END AS kind, "
+            "status, COUNT(*) AS total FROM jobs WHERE 1=1"
+        )
+        params = []
+        if product_type:
+            sql += " AND product_type=?"
+            params.append(product_type)
+        if location:
+            sql += " AND location=?"
+            params.append(location)
+
+        return self.db.get(sql + " GROUP BY product_type, location, kind, status ORDER BY product_type, location, kind", params)
+
+    def print_summary(self, product_type=None, location=None):
+        groups = {}
+        for row in self.summary(product_type, location):
+            key = (row['product_type'], row['location'], row['kind'])
+            groups.setdefault(key, {})[row['status']] = row['total']
+
+        if not groups:
+            print('No jobs registered yet')
+            return
+
+        for (product_type, location, kind), statuses in groups.items():
+            total = sum(statuses.values())
+            finished = sum(statuses.get(status, 0) for status in ('done', 'skipped'))
+            details = ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+            print(f"[{product_type} / {location}] {kind}s {finished}/{total} finished ({details})")
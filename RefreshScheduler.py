@@ -0,0 +1,62 @@
+import math
+import time
+
+
+class RefreshScheduler:
+    """Classe para escolher os registros a revisitar no modo --refresh, sem rodar os feeds de busca
+
+    A prioridade é o tempo desde a última visita à página de detalhes (checked_at), os nunca verificados
+    (como os parciais do --list-only) vêm primeiro. A consulta percorre o índice de checked_at e para no
+    limite. Com popularity os pool_factor × limit mais antigos são reordenados por dias parados ×
+    (1 + log10(1 + rating_count)), assim um local com milhares de avaliações é revisitado antes de um
+    sem avaliações parado há pouco mais tempo. Uma visita que falha também atualiza checked_at e soma
+    check_failures, que divide a prioridade: locais fechados ou que redirecionam não voltam ao topo."""
+
+    POOL_FACTOR = 5  # Candidatos lidos pelo índice para cada registro escolhido com popularity
+
+    def __init__(self, db, popularity=False, pool_factor=POOL_FACTOR):
+        self.db = db
+        self.popularity = popularity
+        self.pool_factor = pool_factor
+
+    def _candidates(self, limit, product_type=None):
+        # Só os registros com a chave do local: a visita grava por (place_id, product_type), uma duplicata antiga
+        # sem place_id nunca seria marcada como verificada e voltaria ao topo em toda execução
+        sql = (
+            "SELECT id, product_type, name, card_href, rating, rating_count, price, category, checked_at, check_failures "
+            "FROM products INDEXED BY idx_products_checked WHERE card_href IS NOT NULL AND place_id IS NOT NULL"
+        )
+        params = []
+        if product_type:
+            sql += " AND product_type=?"
+            params.append(product_type)
+
+        return self.db.get(sql + " ORDER BY checked_at LIMIT ?", params + [limit])
+
+    def _stale_days(self, row, now):
+        if not row['checked_at']: return math.inf
+        checked = time.mktime(time.strptime(row['checked_at'], '%Y-%m-%d %H:%M:%S'))
+        return max(now - checked, 0) / 86400
+
+    def priority(self, row, now=None):
+        """Dias desde a última verificação, multiplicados pelo peso de popularidade quando ativo e divididos pelas falhas"""
+        days = self._stale_days(row, now if now is not None else time.mktime(time.gmtime()))
+        if not self.popularity: return days
+        return days * (1 + math.log10(1 + (row['rating_count'] or 0))) / (1 + (row['check_failures'] or 0))
+
+    def stalest(self, limit, product_type=None):
+        """Retorna os limit registros com maior prioridade de revisita, do mais para o menos urgente"""
+        if not self.popularity: return self._candidates(limit, product_type)
+
+        now = time.mktime(time.gmtime())
+        rows = self._candidates(limit * self.pool_factor, product_type)
+        # Entre os nunca verificados (prioridade infinita) os mais populares vêm primeiro
+        rows.sort(key=lambda row: (self.priority(row, now), row['rating_count'] or 0), reverse=True)
+        return rows[:limit]
+
+    def print_plan(self, rows):
+        never = len([row for row in rows if not row['checked_at']])
+        checked = [row['checked_at'] for row in rows if row['checked_at']]
+        weighting = ' weighted by popularity' if self.popularity else ''
+        print(f"Refresh plan: {len(rows)} places{weighting}, {never} never checked")
+        if checked: print(f"Oldest check: {min(checked)}, newest check: {max(checked)}")
@@ -0,0 +1,106 @@
+import math
+import time
+
+
+class TermScheduler:
+    """Classe para guardar o rendimento de cada termo de busca e decidir a ordem dos termos na próxima execução
+
+    O rendimento de uma execução é registros novos ÷ cards coletados no feed do termo (os cards pulados pelo
+    seen-set contam, o scroll do feed já foi pago). A tabela term_yield guarda a média móvel exponencial por
+    product_type/location/termo. Os termos rodam do maior para o menor rendimento esperado, os abaixo de
+    min_yield são adiados e cada adiado volta a rodar em uma fração explore_rate das execuções (exploração)."""
+
+    SMOOTHING = 0.5  # Peso da execução mais recente na média móvel
+
+    def __init__(self, db, min_yield=0.05, explore_rate=0.2):
+        self.db = db
+        self.min_yield = min_yield
+        self.explore_rate = explore_rate
+        self._create_table()
+
+    def _create_table(self):
+        """Cria a tabela term_yield se não existir"""
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS term_yield (
+                product_type TEXT NOT NULL,
+                location TEXT NOT NULL,
+                search_term TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                cards INTEGER NOT NULL DEFAULT 0,
+                new_records INTEGER NOT NULL DEFAULT 0,
+                last_yield REAL,
+                expected_yield REAL,
+                deferred_runs INTEGER NOT NULL DEFAULT 0,
+                last_run_at TEXT,
+                PRIMARY KEY (product_type, location, search_term)
+            )
+        ''')
+
+    def _now(self):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+    def history(self, product_type, location):
+        """Retorna um dicionário termo -> registro de rendimento do product_type/location"""
+        rows = self.db.get("SELECT * FROM term_yield WHERE product_type=? AND location=?", (product_type, location))
+        return {row['search_term']: row for row in rows}
+
+    def record(self, product_type, location, search_term, new_records, cards):
+        """Registra o resultado de uma execução do termo e atualiza o rendimento esperado.
+        Execuções sem nenhum card (feed não carregou) não entram no histórico"""
+        if not cards: return
+        run_yield = new_records / cards
+        self.db.execute('''
+            INSERT INTO term_yield (product_type, location, search_term, runs, cards, new_records, last_yield, expected_yield, last_run_at)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+            ON CONFLICT(product_type, location, search_term) DO UPDATE SET
+                runs = runs + 1,
+                cards = cards + excluded.cards,
+                new_records = new_records + excluded.new_records,
+                last_yield = excluded.last_yield,
+                expected_yield = COALESCE(? * excluded.last_yield + (1 - ?) * expected_yield, excluded.last_yield),
+                deferred_runs = 0,
+                last_run_at = excluded.last_run_at
+        ''', (
+            product_type, location, search_term, cards, new_records, run_yield, run_yield, self._now(),
+            self.SMOOTHING, self.SMOOTHING
+        ))
+
+    def defer(self, product_type, location, search_terms):
+        """Contabiliza as execuções em que os termos foram adiados, usadas para decidir quando explorá-los"""
+        self.db.execute(
+            "UPDATE term_yield SET deferred_runs = deferred_runs + 1 WHERE product_type=? AND location=? AND search_term=?",
+            [(product_type, location, term) for term in search_terms], many=True
+        )
+
+    def plan(self, product_type, location, search_terms):
+        """Ordena os termos pelo rendimento esperado, retorna (termos para rodar, termos adiados).
+        Termos sem histórico rodam primeiro, na ordem original"""
+        history = self.history(product_type, location)
+        unknown = [term for term in search_terms if term not in history or history[term]['expected_yield'] is None]
+        known = sorted(
+            [term for term in search_terms if term not in unknown],
+            key=lambda term: history[term]['expected_yield'], reverse=True
+        )
+
+        selected = [term for term in known if history[term]['expected_yield'] >= self.min_yield]
+        low = [term for term in known if term not in selected]
+
+        # Cada termo adiado volta a ser testado em uma a cada ceil(1 / explore_rate) execuções, então
+        # explore_rate é a fração das execuções em que ele roda (um termo sozinho também é adiado)
+        period = math.ceil(1 / self.explore_rate) if self.explore_rate > 0 else None
+        explored = [term for term in low if period and history[term]['deferred_runs'] + 1 >= period]
+        deferred = [term for term in low if term not in explored]
+
+        return unknown + selected + explored, deferred
+
+    def print_plan(self, product_type, location, planned, deferred):
+        history = self.history(product_type, location)
+
+        def describe(term):
+            row = history.get(term)
+            if not row or row['expected_yield'] is None: return f"{term} (new)"
+            return f"{term} ({row['expected_yield']:.2f})"
+
+        print(f"Term plan for {product_type} / {location}: {len(planned)} to run, {len(deferred)} deferred (min yield {self.min_yield})")
+        print(f"Running: {', '.join(describe(term) for term in planned)}")
+        if deferred: print(f"Deferred: {', '.join(describe(term) for term in deferred)}")
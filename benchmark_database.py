@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import time
+from DatabaseManager import DatabaseManager
+
+
+def fake_row(i):
+    return {
+        'product_type': 'gastronomy',
+        'name': f'Place {i}',
+        'description': 'Lorem ipsum dolor sit amet ' * 4,
+        'link': f'https://example.com/{i}',
+        'rating': 4.5,
+        'rating_count': i,
+        'latitude': -23.5 + i / 1e6,
+        'longitude': -46.6 + i / 1e6,
+        'phone': '+55 11 0000-0000',
+        'address': f'Street {i}',
+        'card_href': f'https://www.google.com/maps/place/{i}'
+    }
+
+
+def report(label, rows, elapsed):
+    print(f"{label:<45} {rows:>8} rows {elapsed:>8.2f}s {rows / elapsed:>12.0f} rows/sec")
+
+
+def run(table_rows, sample, batch_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before: a new connection and a commit per call, default rollback journal
+        db = DatabaseManager(os.path.join(tmp, 'before.db'), journal_mode='DELETE', synchronous='FULL')
+        db.create_many([fake_row(i) for i in range(table_rows)])
+
+        start = time.time()
+        for i in range(sample):
+            db.create(fake_row(table_rows + i))
+        report('before: create per call', sample, time.time() - start)
+
+        start = time.time()
+        for i in range(1, sample + 1):
+            db.update(i, {'rating': 3.0, 'phone': '+55 11 1111-1111'})
+        report('before: update per call', sample, time.time() - start)
+
+        # After: long-lived WAL connection, batches of rows per commit
+        db = DatabaseManager(os.path.join(tmp, 'after.db'), persistent=True)
+        db.create_many([fake_row(i) for i in range(table_rows)])
+
+        start = time.time()
+        for i in range(0, table_rows, batch_size):
+            db.create_many([fake_row(table_rows + j) for j in range(i, min(i + batch_size, table_rows))])
+        report(f'after: create_many (batch {batch_size})', table_rows, time.time() - start)
+
+        start = time.time()
+        for i in range(1, table_rows + 1, batch_size):
+            db.update_many([(j, {'rating': 3.0, 'phone': '+55 11 1111-1111'}) for j in range(i, min(i + batch_size, table_rows + 1))])
+        report(f'after: update_many (batch {batch_size})', table_rows, time.time() - start)
+
+        start = time.time()
+        with db.transaction():
+            for i in range(sample):
+                db.create(fake_row(table_rows * 2 + i))
+        report('after: create per call inside transaction()', sample, time.time() - start)
+
+        db.close()
+
+
+if __name__ == "__main__":
+    # Usage: python benchmark_database.py [table_rows] [per_call_sample] [batch_size]
+    table_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sample = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    print(f"Table size: {table_rows} rows")
+    run(table_rows, sample, batch_size)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from payload import XSSI_PREFIX, PayloadCapture, clean, decode_document, decode_payload, parse_place, payload_place_id
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark', 'fixtures')
+PLACE_ID = '0x94ce59c8da0aa315:0xd59f9431f2c9776a'
+
+# Columns decoded from benchmark/fixtures/place_payload.txt
+EXPECTED = {
+    'name': 'Bistrô Exemplo',
+    'rating': 4.6,
+    'rating_count': 1287,
+    'phone': '(11) 3333-4444',
+    'address': 'Av. Paulista, 1578 - Bela Vista, São Paulo - SP, 01310-200',
+    'link': 'https://www.example-bistro.com/',
+    'latitude': -23.5614419,
+    'longitude': -46.6558819,
+    'price': '$$'
+}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def place_document(payload_text):
+    # place.html with the saved payload embedded in its APP_INITIALIZATION_STATE, as on a direct page load
+    state = json.dumps([None, None, None, [None] * 6 + [payload_text.strip()]])
+    return read_fixture('place.html').replace('__APP_STATE__', state)
+
+
+class FakeResponse:
+    # The attributes of a Playwright response read by PayloadCapture.on_response
+
+    def __init__(self, url, text, resource_type='xhr'):
+        self.url = url
+        self.request = type('Request', (), {'resource_type': resource_type})()
+        self._text = text
+
+    async def text(self):
+        return self._text
+
+
+def other_place(payload_text):
+    return payload_text.replace(PLACE_ID, '0x94ce5000000001:0x0000000000000001')
+
+
+async def check_capture(payload_text):
+    capture = PayloadCapture()
+    capture.reset(PLACE_ID.upper())
+    # A late response of another place is ignored, the one of the navigated place is kept
+    await capture.on_response(FakeResponse('https://www.google.com/maps/preview/place?pb=1', other_place(payload_text)))
+    assert capture.payload is None and capture.ignored == 1
+    await capture.on_response(FakeResponse('https://www.google.com/maps/preview/place?pb=2', payload_text))
+    assert payload_place_id(await capture.wait(0.1)) == PLACE_ID
+
+    capture.reset(PLACE_ID)
+    await capture.on_response(FakeResponse('https://www.google.com/maps/place/Bistro/', place_document(payload_text), 'document'))
+    assert payload_place_id(capture.payload) == PLACE_ID
+    await capture.on_response(FakeResponse('https://www.google.com/maps/preview/place?pb=3', other_place(payload_text)))
+    assert payload_place_id(capture.payload) == PLACE_ID
+
+    # A card_href without a feature id gives no id to compare, every place payload is kept
+    capture.reset('/g/11abc123')
+    await capture.on_response(FakeResponse('https://www.google.com/maps/preview/place?pb=4', other_place(payload_text)))
+    assert payload_place_id(capture.payload) == '0x94ce5000000001:0x0000000000000001'
+
+
+def check(payload_text):
+    payload = decode_payload(payload_text)
+    assert payload is not None, 'XSSI-prefixed payload not decoded'
+    assert decode_payload(payload_text.replace(XSSI_PREFIX, '', 1)) == payload
+    assert decode_payload('<html>not a payload</html>') is None and decode_payload('') is None
+    assert payload_place_id(payload) == PLACE_ID
+    assert parse_place(payload) == EXPECTED, parse_place(payload)
+    assert parse_place([None]) == {} and parse_place(None) == {}
+
+    document = decode_document(place_document(payload_text))
+    assert document == payload, 'payload embedded in place.html not decoded'
+    assert decode_document(read_fixture('search.html')) is None
+
+    assert clean('link', '/url?q=https://www.example-bistro.com/&opi=79508299&sa=U', {}) == 'https://www.example-bistro.com/'
+    assert clean('link', 'https://direct.example.com/', {}) == 'https://direct.example.com/'
+    assert clean('address', 'Bistrô Exemplo, Av. Paulista, 1578', {'name': 'Bistrô Exemplo'}) == 'Av. Paulista, 1578'
+    assert clean('address', 'Av. Paulista, 1578', {'name': 'Bistrô Exemplo'}) == 'Av. Paulista, 1578'
+    assert clean('rating', 'n/a', {}) is None and clean('rating_count', '1287', {}) == 1287
+    assert clean('phone', ['nested'], {}) is None and clean('phone', '', {}) is None
+
+    asyncio.run(check_capture(payload_text))
+    print('Payload fixture checks passed')
+
+
+def run(iterations, payload_text):
+    document = place_document(payload_text)
+    for label, decode in (('decode_payload + parse_place', lambda: parse_place(decode_payload(payload_text))),
+                          ('decode_document + parse_place', lambda: parse_place(decode_document(document)))):
+        start = time.time()
+        for _ in range(iterations):
+            decode()
+        elapsed = time.time() - start
+        print(f"{label:<35} {iterations:>8} x {elapsed / iterations * 1e6:>8.1f} us")
+
+
+if __name__ == "__main__":
+    # Usage: python benchmark_payload.py [iterations], asserts the decoder against the saved fixtures before timing it
+    payload_text = read_fixture('place_payload.txt')
+    check(payload_text)
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, payload_text)
@@ -0,0 +1,270 @@
+import asyncio
+import contextvars
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+from playwright.async_api import async_playwright
+import metrics
+import scrapper_google_business as scraper
+from DatabaseManager import DatabaseManager
+from getters import get_property, get_snapshot, COLUMNS
+from options import get_option
+from payload import XSSI_PREFIX
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark', 'fixtures')
+
+_current_card_calls = contextvars.ContextVar('current_card_calls', default=None)
+
+
+def fake_places(count):
+    categories = ['Restaurant', 'Bar', 'Cafe', 'Bistro', 'Pizzeria']
+    return [
+        {
+            'id': i,
+            'name': f'Place {i}',
+            'rating': round(3.5 + (i % 15) / 10, 1),
+            'rating_count': 37 * i + 11,
+            'price': '$' * (i % 4 + 1),
+            'category': categories[i % len(categories)],
+            'address': f'{100 + i} Fixture Street',
+            'phone': f'+1 555-01{i:02d}',
+            'link': f'https://place-{i}.example.com/',
+            'description': f'Place {i} is a fixture business used by the offline benchmark.',
+            'facilities': ['Wheelchair accessible entrance', 'Outdoor seating'] if i % 2 else ['Takeout'],
+            'stars': i % 5 + 1 if i % 3 == 0 else None,
+            'lat': round(-23.55 + i / 1000, 6),
+            'lon': round(-46.63 + i / 1000, 6)
+        }
+        for i in range(count)
+    ]
+
+
+def fixture_place_id(place):
+    return f"0x94ce5{place['id']:05x}:0x{place['id']:016x}"
+
+
+def app_state(place):
+    # Same layout as the payload decoded by payload.parse_place, wrapped in an APP_INITIALIZATION_STATE
+    data = [None] * 179
+    data[10] = fixture_place_id(place)
+    data[4] = [None, None, place['price'], None, None, None, None, place['rating'], place['rating_count']]
+    data[7] = [place['link']]
+    data[9] = [None, None, place['lat'], place['lon']]
+    data[11] = place['name']
+    data[18] = f"{place['name']}, {place['address']}"
+    data[178] = [[place['phone']]]
+    payload = XSSI_PREFIX + '\n' + json.dumps([None] * 6 + [data])
+    return json.dumps([None, None, None, [None] * 6 + [payload]])
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    # Serves the fixtures as if they were Google Maps search feeds and place pages
+
+    def do_GET(self):
+        path = unquote(self.path)
+        server = self.server
+        if path.startswith('/maps/search/'):
+            cards = [dict(place, href=place_url(server.base_url, place)) for place in server.places]
+            body = server.templates['search'] \
+                .replace('__CARDS__', json.dumps(cards)) \
+                .replace('__PAGE_SIZE__', str(server.page_size)) \
+                .replace('__LOAD_DELAY__', str(server.load_delay))
+        elif path.startswith('/maps/place/'):
+            match = re.search(r'/maps/place/Place\+(\d+)/', self.path)
+            if not match or int(match.group(1)) >= len(server.places): return self.send_error(404)
+            body = server.templates['place'] \
+                .replace('__PLACE__', json.dumps(server.places[int(match.group(1))])) \
+                .replace('__APP_STATE__', app_state(server.places[int(match.group(1))])) \
+                .replace('__RENDER_DELAY__', str(server.render_delay))
+        else:
+            return self.send_error(404)
+
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def place_url(base_url, place):
+    return (
+        f"{base_url}/maps/place/Place+{place['id']}/@{place['lat']},{place['lon']},17z/"
+        f"data=!4m7!3m6!1s{fixture_place_id(place)}!8m2!3d{place['lat']}!4d{place['lon']}"
+    )
+
+
+def start_server(places, page_size, load_delay, render_delay):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    server.places = places
+    server.page_size = page_size
+    server.load_delay = load_delay
+    server.render_delay = render_delay
+    server.templates = {}
+    for name in ('search', 'place'):
+        with open(os.path.join(FIXTURES, f'{name}.html'), encoding='utf-8') as f:
+            server.templates[name] = f.read()
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class CallCounter:
+    """Counts Playwright protocol round trips, in total and for the card being processed by the current task"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def install(self):
+        from playwright._impl._connection import Channel
+        original = Channel.send
+        counter = self
+
+        async def send(channel, *args, **kwargs):
+            counter.calls += 1
+            card_calls = _current_card_calls.get()
+            if card_calls is not None: card_calls[0] += 1
+            return await original(channel, *args, **kwargs)
+
+        Channel.send = send
+
+
+def percentile(values, pct):
+    if not values: return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def print_distribution(label, values, unit='s'):
+    if not values:
+        print(f"{label:<32} no samples")
+        return
+    print(
+        f"{label:<32} n={len(values):<4} p50={percentile(values, 50):.3f}{unit} p90={percentile(values, 90):.3f}{unit} "
+        f"p99={percentile(values, 99):.3f}{unit} max={max(values):.3f}{unit}"
+    )
+
+
+async def bench_feed(page, counter):
+    calls_before = counter.calls
+    start = time.time()
+    card_links = await scraper.load_feed(page, 'Benchmark City', 'restaurants')
+    feed_time = time.time() - start
+    print(f"load_feed: {len(card_links or [])} cards in {feed_time:.2f}s, {counter.calls - calls_before} Playwright calls")
+
+    for extraction in ('snapshot', 'locator'):
+        calls_before = counter.calls
+        start = time.time()
+        card_links = await scraper.collect_card_links(page, extraction)
+        print(f"collect_card_links ({extraction}): {len(card_links)} cards in {time.time() - start:.3f}s, {counter.calls - calls_before} Playwright calls")
+    return card_links
+
+
+async def bench_getters(page, counter, card):
+    await page.goto(card['href'])
+    await scraper.wait_for_place(page)
+
+    for column in COLUMNS:
+        calls_before = counter.calls
+        start = time.time()
+        await get_property(page, column)
+        print(f"get_property({column!r}):{'':<{14 - len(column)}} {time.time() - start:.3f}s, {counter.calls - calls_before} calls")
+
+    calls_before = counter.calls
+    start = time.time()
+    await get_snapshot(page)
+    print(f"get_snapshot():{'':<16} {time.time() - start:.3f}s, {counter.calls - calls_before} calls")
+
+
+async def bench_term(page, detail_pages, counter, extraction):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'benchmark.db'), persistent=True)
+        card_latencies = []
+        card_calls = []
+        write_times = []
+
+        # Wraps the module functions used by card_worker to time each card and its DB write
+        original_extract = scraper.extract_details_from_modal
+        original_upsert = db.upsert
+
+        async def timed_extract(*args, **kwargs):
+            calls = [0]
+            _current_card_calls.set(calls)
+            start = time.time()
+            try: return await original_extract(*args, **kwargs)
+            finally:
+                card_latencies.append(time.time() - start)
+                card_calls.append(calls[0])
+                _current_card_calls.set(None)
+
+        def timed_upsert(data):
+            start = time.time()
+            try: return original_upsert(data)
+            finally: write_times.append(time.time() - start)
+
+        scraper.extract_details_from_modal = timed_extract
+        db.upsert = timed_upsert
+        start = time.time()
+        try:
+            await scraper.process_search_term(page, db, 'gastronomy', 'Benchmark City', 'restaurants', None, detail_pages, extraction, set())
+        finally:
+            scraper.extract_details_from_modal = original_extract
+
+        total = time.time() - start
+        db.close()
+
+    print(f"\nprocess_search_term ({extraction}, {len(detail_pages)} workers): {len(card_latencies)} cards in {total:.2f}s")
+    print_distribution('Card latency (detail page)', card_latencies)
+    print_distribution('Playwright calls per card', card_calls, unit='')
+    print_distribution('DB write time', write_times)
+    if write_times: print(f"DB write time total: {sum(write_times):.3f}s")
+
+
+async def main():
+    # Usage: python benchmark_scraper.py [--cards=60] [--workers=4] [--extraction=snapshot|locator|payload] [--render-delay=ms] [--load-delay=ms]
+    #        [--metrics-jsonl=path] [--metrics-prom=path]
+    cards = get_option('cards', 60, int)
+    workers = max(get_option('workers', scraper.WORKERS, int), 1)
+    extraction = get_option('extraction', scraper.EXTRACTION_MODE)
+    server = start_server(
+        fake_places(cards),
+        get_option('page-size', 20, int),
+        get_option('load-delay', 300, int),
+        get_option('render-delay', 200, int)
+    )
+    scraper.MAPS_URL = f'{server.base_url}/maps'
+    metrics.configure(get_option('metrics-jsonl'), get_option('metrics-prom'))
+    counter = CallCounter()
+    counter.install()
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        page = await context.new_page()
+        detail_pages = [page] + [await context.new_page() for _ in range(workers - 1)]
+
+        card_links = await bench_feed(page, counter)
+        print()
+        if card_links: await bench_getters(page, counter, card_links[0])
+        await bench_term(page, detail_pages, counter, extraction)
+
+        await browser.close()
+
+    metrics.flush()
+    print('\nWhole run:')
+    metrics.print_summary(totals=True)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,14 +1,38 @@
+import asyncio
+import json
 import os
 import time
 import re
 from DatabaseManager import DatabaseManager
+from DescriptionCache import DescriptionCache
 from dotenv import load_dotenv
-from google import genai
+from fake_genai import FakeClient
+from options import get_option
+from prompts import MODEL, DESCRIPTION_LIMITS, PLACEHOLDER_DESCRIPTION, PROMPT_VERSION, build_prompt, build_batch_prompt
+
+
+def create_client():
+    # --fake uses a local client that injects latency and quota errors instead of calling the API
+    if get_option('fake'):
+        return FakeClient(error_rate=get_option('fake-error-rate', 0.1, float))
+
+    from google import genai
+    return genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+
 
 load_dotenv()
-db = DatabaseManager()
-client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+db = DatabaseManager(persistent=True)
+cache = DescriptionCache(db, PROMPT_VERSION)
+client = create_client()
 RESOURCE_EXHAUSTED = 0
+API_CALLS = 0
+
+CONCURRENCY = 4  # Requests in flight on --async mode
+RPM = 15  # Requests per minute allowed by the API quota
+TPM = 250000  # Tokens per minute allowed by the API quota
+OUTPUT_TOKENS = 150  # Upper estimate of a 400 character description
+BATCH_SIZE = 10  # Businesses packed in one prompt on --batch mode
+CHUNK_SIZE = 5000  # Rows loaded from the DB per round, overridable with --chunk=N
 
 
 def extract_retry_delay_from_error(error):
@@ -24,12 +48,88 @@ def extract_retry_delay_from_error(error):
     return 10
 
 
+class TokenBucket:
+    """Token bucket refilled continuously up to `per_minute` tokens"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Limits requests by RPM and TPM at the same time"""
+
+    def __init__(self, rpm=RPM, tpm=TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, tokens):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+
+def estimate_tokens(prompt):
+    return len(prompt) // 4 + OUTPUT_TOKENS
+
+
+def parse_batch_response(text, registries):
+    # Returns ({id: description} of the valid items, registries that must be sent again)
+    try: items = json.loads(text)
+    except (ValueError, TypeError): items = []
+    if not isinstance(items, list): items = []
+
+    descriptions = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('description'), str): continue
+        description = item['description'].strip()
+        if DESCRIPTION_LIMITS[0] <= len(description) <= DESCRIPTION_LIMITS[1]:
+            try: descriptions[int(item.get('id'))] = description
+            except (ValueError, TypeError): continue
+
+    valid = {registry['id']: descriptions[registry['id']] for registry in registries if registry['id'] in descriptions}
+    failed = [registry for registry in registries if registry['id'] not in valid]
+    return valid, failed
+
+
 def create_promotional_description(card_href):
-    prompt = (
-        f'Vasculhe as reviews da ficha deste negócio do Google Maps ({card_href}), e gere um texto de descrição promocional curto e persuasivo para esse local, citando diferenciais e elogios recorrentes (em inglês). O retorno deve ser apenas da descrição em texto simples, sem simbolos, HTML ou parágrafos. O retorno também deve ter no mínimo 100 caracteres e no máximo 400 caracteres.'
-    )
     resp = client.models.generate_content(
-        model="gemini-2.5-flash-lite", contents=prompt
+        model=MODEL, contents=build_prompt(card_href)
+    )
+    return resp.text
+
+
+async def create_promotional_description_async(card_href, limiter):
+    global API_CALLS
+    prompt = build_prompt(card_href)
+    await limiter.acquire(estimate_tokens(prompt))
+    API_CALLS += 1
+    resp = await client.aio.models.generate_content(model=MODEL, contents=prompt)
+    return resp.text
+
+
+async def create_batch_descriptions_async(registries, limiter):
+    global API_CALLS
+    prompt = build_batch_prompt(registries)
+    await limiter.acquire(len(prompt) // 4 + OUTPUT_TOKENS * len(registries))
+    API_CALLS += 1
+    resp = await client.aio.models.generate_content(
+        model=MODEL, contents=prompt, config={'response_mime_type': 'application/json'}
     )
     return resp.text
 
@@ -44,6 +144,7 @@ def process_registry(reg_id, card_href, max_retries=3):
             print(description)
 
             db.update(reg_id, {'description': description})
+            cache.put(card_href, description)
             print(f"{reg_id} updated...")
 
             RESOURCE_EXHAUSTED = 0
@@ -64,20 +165,175 @@ def process_registry(reg_id, card_href, max_retries=3):
             continue
 
 
+async def process_registry_async(reg_id, card_href, limiter, semaphore, max_retries=3):
+    # Same flow as process_registry, but a retryDelay only pauses this request
+    global RESOURCE_EXHAUSTED
+    for _ in range(max_retries):
+        if RESOURCE_EXHAUSTED >= 9: return
+
+        try:
+            async with semaphore:
+                description = await create_promotional_description_async(card_href, limiter)
+
+            print(description)
+
+            db.update(reg_id, {'description': description})
+            cache.put(card_href, description)
+            print(f"{reg_id} updated...")
+
+            RESOURCE_EXHAUSTED = 0
+            return
+        except Exception as e:
+            print(f"Erro no id {reg_id}:")
+            error_text = str(e)
+            if 'RESOURCE_EXHAUSTED' in error_text:
+                print('RESOURCE_EXHAUSTED')
+                RESOURCE_EXHAUSTED += 1
+                delay = extract_retry_delay_from_error(e) + 1
+                print(f"Aguardando {delay} segundos conforme retryDelay da API (apenas o id {reg_id})...")
+                await asyncio.sleep(delay)
+            else:
+                print(error_text)
+
+
+async def process_batch_async(registries, limiter, semaphore, max_retries=3):
+    # Generates a batch in one call and writes the valid descriptions in one bulk update, returns the failed registries
+    global RESOURCE_EXHAUSTED
+    ids = ', '.join(str(registry.get('id')) for registry in registries)
+    for _ in range(max_retries):
+        if RESOURCE_EXHAUSTED >= 9: break
+
+        try:
+            async with semaphore:
+                text = await create_batch_descriptions_async(registries, limiter)
+
+            valid, failed = parse_batch_response(text, registries)
+            db.update_many([(reg_id, {'description': description}) for reg_id, description in valid.items()])
+            cache.put_many({registry.get('card_href'): valid[registry['id']] for registry in registries if registry['id'] in valid})
+            print(f"Lote {ids}: {len(valid)} atualizados, {len(failed)} inválidos")
+
+            RESOURCE_EXHAUSTED = 0
+            return failed
+        except Exception as e:
+            print(f"Erro no lote {ids}:")
+            error_text = str(e)
+            if 'RESOURCE_EXHAUSTED' in error_text:
+                print('RESOURCE_EXHAUSTED')
+                RESOURCE_EXHAUSTED += 1
+                delay = extract_retry_delay_from_error(e) + 1
+                print(f"Aguardando {delay} segundos conforme retryDelay da API (apenas este lote)...")
+                await asyncio.sleep(delay)
+            else:
+                print(error_text)
+
+    return registries
+
+
+async def main_batch(data, batch_size, concurrency, rpm, tpm, max_attempts=3):
+    # Only the items that failed validation go back to the queue, repacked into new batches
+    limiter = RateLimiter(rpm, tpm)
+    semaphore = asyncio.Semaphore(concurrency)
+    attempts = {}
+    pending = list(data)
+    start = time.time()
+
+    while pending and RESOURCE_EXHAUSTED < 9:
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        results = await asyncio.gather(*[process_batch_async(batch, limiter, semaphore) for batch in batches])
+
+        pending = []
+        for failed in results:
+            for registry in failed:
+                attempts[registry['id']] = attempts.get(registry['id'], 0) + 1
+                if attempts[registry['id']] < max_attempts: pending.append(registry)
+
+        if pending: print(f"Reenviando {len(pending)} registros inválidos...")
+
+    if RESOURCE_EXHAUSTED >= 9:
+        print('A API do Gemini não está respondendo, encerrando o fluxo...')
+
+    print(f"Chamadas à API: {API_CALLS} ({API_CALLS / len(data) * 1000:.0f} por 1000 registros, lotes de {batch_size})")
+    print(f"Tempo total: {time.time() - start:.2f} segundos")
+
+
+async def main_async(data, concurrency, rpm, tpm):
+    limiter = RateLimiter(rpm, tpm)
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.time()
+
+    await asyncio.gather(*[
+        process_registry_async(registry.get('id'), registry.get('card_href'), limiter, semaphore)
+        for registry in data
+    ])
+
+    if RESOURCE_EXHAUSTED >= 9:
+        print('A API do Gemini não está respondendo, encerrando o fluxo...')
+
+    print(f"Chamadas à API: {API_CALLS} ({API_CALLS / len(data) * 1000:.0f} por 1000 registros)")
+    print(f"Tempo total: {time.time() - start:.2f} segundos ({concurrency} requisições simultâneas, {rpm} RPM, {tpm} TPM)")
+
+
+def apply_cached_descriptions(data):
+    # Writes the cached descriptions in one bulk update, returns only the rows that still need the API
+    cached = cache.get_many([registry.get('card_href') for registry in data if registry.get('card_href')])
+    db.update_many([
+        (registry.get('id'), {'description': cached[registry.get('card_href')]})
+        for registry in data if registry.get('card_href') in cached
+    ])
+    print(f"Descrições reaproveitadas do cache: {len(cached)}")
+    return [registry for registry in data if registry.get('card_href') not in cached]
+
+
 def main():
-    data = db.get(
-        "SELECT * from products WHERE description IS NULL OR description='' OR description=?",
-        ['Based on sightseeing, recreation, and getting around']
+    where = "description IS NULL OR description='' OR description=?"
+    count = db.get(f"SELECT COUNT(*) AS total FROM products WHERE {where}", [PLACEHOLDER_DESCRIPTION])
+    total = count[0]['total'] if count else 0
+
+    print(f"Registros encontrados: {total}")
+    if total == 0:
+        exit()
+
+    # Only the columns used by the prompts are loaded, CHUNK_SIZE rows at a time
+    cache.evict()
+    chunks = db.iter_chunks(
+        f"SELECT id, name, card_href, facilities, rating FROM products WHERE {where} ORDER BY id",
+        [PLACEHOLDER_DESCRIPTION], get_option('chunk', CHUNK_SIZE, int)
     )
+    try:
+        for data in chunks:
+            generate(apply_cached_descriptions(data))
+            if RESOURCE_EXHAUSTED >= 9: break
+    finally: cache.print_stats()
+
 
-    print(f"Registros encontrados: {len(data)}")
+def generate(data):
     if len(data) == 0:
-        exit()
+        return
+
+    if get_option('batch'):
+        batch_size = get_option('batch', BATCH_SIZE, int)
+        asyncio.run(main_batch(
+            data,
+            BATCH_SIZE if batch_size is True else batch_size,
+            get_option('concurrency', CONCURRENCY, int),
+            get_option('rpm', RPM, float),
+            get_option('tpm', TPM, float)
+        ))
+        return
+
+    if get_option('async'):
+        asyncio.run(main_async(
+            data,
+            get_option('concurrency', CONCURRENCY, int),
+            get_option('rpm', RPM, float),
+            get_option('tpm', TPM, float)
+        ))
+        return
 
     for registry in data:
         if RESOURCE_EXHAUSTED >= 9:
             print('A API do Gemini não está respondendo, encerrando o fluxo...')
-            exit()
+            return
 
         reg_id = registry.get('id')
         href = registry.get('card_href')
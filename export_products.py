@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+import time
+from DatabaseManager import DatabaseManager
+from options import get_option, get_positional
+
+
+FORMATS = ['csv', 'jsonl', 'parquet']
+CHUNK_SIZE = 5000  # Rows read per fetchmany and written per Parquet row group, overridable with --chunk=N
+
+# Column types of the products table, used to build a fixed Parquet schema before the first row is read
+PARQUET_TYPES = {
+    'id': 'int64', 'product_type': 'string', 'name': 'string', 'description': 'string', 'link': 'string',
+    'images': 'string', 'rating': 'float64', 'rating_count': 'int64', 'facilities': 'string', 'latitude': 'float64',
+    'longitude': 'float64', 'phone': 'string', 'address': 'string', 'stars': 'int64', 'price': 'string',
+    'card_href': 'string', 'scraped_at': 'string', 'place_id': 'string',
+    'category': 'string', 'partial': 'int64', 'checked_at': 'string', 'check_failures': 'int64'
+}
+
+
+def export_csv(rows, columns, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def export_jsonl(rows, columns, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        count = 0
+        for row in rows:
+            f.write(json.dumps({column: row.get(column) for column in columns}, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def export_parquet(rows, columns, path, chunk_size=CHUNK_SIZE):
+    # pyarrow is only needed for this format, so it is imported here instead of being a hard dependency
+    try: import pyarrow as pa, pyarrow.parquet as pq
+    except ImportError:
+        print('Parquet export requires pyarrow: pip install pyarrow')
+        exit(1)
+
+    schema = pa.schema([(column, getattr(pa, PARQUET_TYPES.get(column, 'string'))()) for column in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            count += len(chunk)
+    return count
+
+
+def main():
+    # Usage: python export_products.py <output path> [--format=csv|jsonl|parquet] [--type=hotel] [--columns=a,b] [--db=path] [--chunk=N]
+    positional = get_positional()
+    path = positional[0] if positional else input('Inform the output file: ')
+    output_format = get_option('format', os.path.splitext(path)[1].lstrip('.').lower())
+    if output_format not in FORMATS:
+        print(f"Format not supported, use one of: {', '.join(FORMATS)}")
+        exit(1)
+
+    db = DatabaseManager(get_option('db', 'products.db'))
+    table_columns = [row['name'] for row in db.get("PRAGMA table_info(products)")]
+    columns_param = get_option('columns')
+    columns = [column.strip() for column in columns_param.split(',')] if columns_param else table_columns
+
+    # Column names go straight into the SQL, so only the ones of the table are accepted
+    invalid = [column for column in columns if column not in table_columns]
+    if invalid:
+        print(f"Column not found: {', '.join(invalid)}. Use: {', '.join(table_columns)}")
+        exit(1)
+
+    sql = f"SELECT {', '.join(columns)} FROM products"
+    params = []
+    product_type = get_option('type')
+    if product_type:
+        sql += " WHERE product_type=?"
+        params.append(product_type)
+    sql += " ORDER BY id"
+
+    chunk_size = get_option('chunk', CHUNK_SIZE, int)
+    rows = db.iter_query(sql, params, chunk_size)
+    start = time.time()
+
+    if output_format == 'csv': count = export_csv(rows, columns, path)
+    elif output_format == 'jsonl': count = export_jsonl(rows, columns, path)
+    else: count = export_parquet(rows, columns, path, chunk_size)
+
+    db.close()
+    elapsed = time.time() - start
+    print(f"Exported {count} rows to {path} ({output_format}) in {elapsed:.2f} seconds ({count / elapsed if elapsed else 0:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
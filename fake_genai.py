@@ -0,0 +1,64 @@
+import asyncio
+import json
+import random
+import time
+from types import SimpleNamespace
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    """Imita client.models do google-genai, injetando latência e erros de quota"""
+
+    def __init__(self, latency=(0.2, 1.0), error_rate=0.1, retry_delay=2):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_delay = retry_delay
+        self.calls = 0
+        self.errors = 0
+
+    def _description(self, seed):
+        return (
+            f"A charming local favorite praised by visitors for its friendly staff, great atmosphere and "
+            f"excellent value, making it a must visit spot for anyone exploring the area. (#{abs(hash(seed)) % 10000})"
+        )
+
+    def _respond(self, contents, config=None):
+        self.calls += 1
+        if random.random() < self.error_rate:
+            self.errors += 1
+            raise Exception(
+                f"429 RESOURCE_EXHAUSTED. {{'error': {{'code': 429, 'status': 'RESOURCE_EXHAUSTED', "
+                f"'details': [{{'retryDelay': '{self.retry_delay}s'}}]}}}}"
+            )
+
+        if config and config.get('response_mime_type') == 'application/json':
+            # Batch prompt: answers every business of the JSON list, some with a too short description
+            items = json.loads(contents[contents.index('['):])
+            return FakeResponse(json.dumps([
+                {'id': item['id'], 'description': 'Too short.' if random.random() < self.error_rate else self._description(item['card_href'])}
+                for item in items
+            ]))
+
+        return FakeResponse(self._description(contents))
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(random.uniform(*self.latency))
+        return self._respond(contents, config)
+
+
+class FakeAsyncModels(FakeModels):
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(random.uniform(*self.latency))
+        return self._respond(contents, config)
+
+
+class FakeClient:
+    """Cliente local para testar o fluxo de descrições sem chamar a API do Gemini"""
+
+    def __init__(self, latency=(0.2, 1.0), error_rate=0.1, retry_delay=2):
+        self.models = FakeModels(latency, error_rate, retry_delay)
+        self.aio = SimpleNamespace(models=FakeAsyncModels(latency, error_rate, retry_delay))
@@ -0,0 +1,21 @@
+import math
+
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    # Haversine distance, accurate enough for the few hundred meters compared by the dedup
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, radius_m):
+    # (min_lat, max_lat, min_lon, max_lon) of the square containing the circle, used as the index lookup
+    d_lat = radius_m / METERS_PER_DEGREE
+    d_lon = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
@@ -1,8 +1,16 @@
 import re
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+import metrics
 from parsers import parse_rating_count, parse_price, parse_facilities, parse_img, parse_stars
+from readiness import wait_for_tab, ABOUT_PANEL_SELECTOR
 
 
 async def get_property(page, column):
+    with metrics.timer('getter_seconds', column=column):
+        return await _get_property(page, column)
+
+
+async def _get_property(page, column):
     if column == 'name':
         return await get_name(page)
 
@@ -46,9 +54,108 @@ async def get_property(page, column):
     exit()
 
 
+async def lookup(selector, action):
+    # Awaits a locator action, counting the timeouts per selector so a slow fallback shows up in the metrics
+    try: return await action
+    except PlaywrightTimeoutError:
+        metrics.increment('selector_timeouts_total', selector=selector)
+        raise
+
+
+COLUMNS = ['name', 'description', 'link', 'rating', 'rating_count', 'latitude', 'longitude', 'phone', 'address', 'stars', 'images', 'price', 'facilities']
+SNAPSHOT_COLUMNS = ['name', 'rating', 'rating_count', 'latitude', 'longitude', 'phone', 'address', 'stars', 'images', 'link', 'price']
+
+# Same selectors and fallback order used by the individual getters below, resolved in a single round trip
+SNAPSHOT_SCRIPT = """() => {
+    const first = (selector) => document.querySelector(selector);
+    const text = (selector) => { const el = first(selector); return el ? el.innerText : null; };
+    const attr = (selector, name) => { const el = first(selector); return el ? el.getAttribute(name) : null; };
+    const stars = Array.from(document.querySelectorAll('span')).find(el => el.textContent.includes('star hotel'));
+
+    return {
+        name: text('h1.DUwDvf, h1'),
+        rating: text('.F7nice span[aria-hidden="true"]'),
+        rating_count: attr('span[aria-label*=" reviews"]', 'aria-label') ?? text('.Bd93Zb .HHrUdb span'),
+        phone: text('button[data-item-id*="phone"] .Io6YTe'),
+        address: text('button[data-item-id="address"] .Io6YTe'),
+        stars: stars ? stars.textContent : null,
+        images: attr('img[src*="googleusercontent.com"]', 'src') || attr('img[src*="streetviewpixels-pa.googleapis.com"]', 'src'),
+        link: first('a[data-item-id="authority"]') ? attr('a[data-item-id="authority"]', 'href') : attr('.SlvSdc.co54Ed.e3R2ac', 'href'),
+        price: attr('[aria-label*="$"], [aria-label*="R$"], [aria-label*="€"]', 'aria-label') ?? text('.drwWxc, .NFP9ae') ?? text('.MNVeJb div'),
+    };
+}"""
+
+
+async def get_snapshot(page):
+    # Extracts every column in SNAPSHOT_COLUMNS with one page.evaluate, missing fields cost no timeout
+    try:
+        with metrics.timer('snapshot_seconds'): raw = await page.evaluate(SNAPSHOT_SCRIPT)
+    except: raw = {}
+
+    rating_count = raw.get('rating_count')
+    stars = raw.get('stars')
+    img = raw.get('images')
+    price = raw.get('price')
+
+    return {
+        'name': raw.get('name'),
+        'rating': raw.get('rating'),
+        'rating_count': parse_rating_count(rating_count) if rating_count is not None else None,
+        'latitude': await get_lat(page),
+        'longitude': await get_lon(page),
+        'phone': raw.get('phone'),
+        'address': raw.get('address'),
+        'stars': parse_stars(stars) if stars else None,
+        'images': parse_img(img) if img else None,
+        'link': raw.get('link'),
+        'price': parse_price(price) if price else None
+    }
+
+
+# Every card of the search feed in one round trip: href, name, facilities and the rating, price and category shown on it
+CARDS_SCRIPT = """(cardSelector) => Array.from(document.querySelectorAll(cardSelector)).map(card => {
+    const text = (selector) => { const el = card.querySelector(selector); return el ? el.innerText.trim() : null; };
+    const link = card.querySelector('a.hfpxzc');
+    const price = card.querySelector('[aria-label*="$"], [aria-label*="R$"], [aria-label*="€"], [aria-label^="Price"]');
+    const infoRows = Array.from(card.querySelectorAll('.W4Efsd')).filter(row => !row.querySelector('.W4Efsd, .MW4etd'));
+    const category = infoRows.length ? infoRows[0].querySelector('span > span') : null;
+
+    return {
+        href: link ? link.getAttribute('href') : null,
+        name: text('.qBF1Pd.fontHeadlineSmall'),
+        facilities: Array.from(card.querySelectorAll('.Yfjtfe.dc6iWb[aria-label]')).map(el => el.getAttribute('aria-label')).filter(Boolean),
+        rating: text('.MW4etd'),
+        rating_count: text('.UY7F9'),
+        price: price ? price.getAttribute('aria-label') : null,
+        category: category ? category.innerText.trim() : null
+    };
+})"""
+
+
+async def get_cards(page, card_selector):
+    # Parses the feed cards returned by CARDS_SCRIPT, raises when the evaluate fails so the caller can fall back
+    cards = []
+    for raw in await page.evaluate(CARDS_SCRIPT, card_selector):
+        rating = raw.get('rating')
+        try: rating = float(rating.replace(',', '.')) if rating else None
+        except ValueError: rating = None
+
+        cards.append({
+            'href': raw.get('href'),
+            'name_preview': raw.get('name') or None,
+            'facilities': raw.get('facilities') or [],
+            'rating': rating,
+            'rating_count': parse_rating_count(raw['rating_count']) if raw.get('rating_count') else None,
+            'price': parse_price(raw['price']) if raw.get('price') else None,
+            'category': raw.get('category') or None
+        })
+
+    return cards
+
+
 async def get_name(page):
     try:
-        name = await page.locator('h1.DUwDvf, h1').first.inner_text(timeout=1000)
+        name = await lookup('h1.DUwDvf, h1', page.locator('h1.DUwDvf, h1').first.inner_text(timeout=1000))
     except: name = None
 
     return name
@@ -56,12 +163,12 @@ async def get_name(page):
 
 async def get_description(page):
     try:  # Description
-        await page.locator('button[role="tab"] >> text=About').first.click()
-        await page.wait_for_timeout(1000)
+        await lookup('About tab', page.locator('button[role="tab"] >> text=About').first.click())
+        await wait_for_tab(page, 'About', ABOUT_PANEL_SELECTOR)
         desc_els = await page.locator('.P1LL5e, .HlvSq').all()
         desc = "\n".join([await d.inner_text(timeout=1000) for d in desc_els if await d.inner_text(timeout=1000)])
-        await page.locator('button[role="tab"] >> text=Overview').first.click()
-        await page.wait_for_timeout(1000)
+        await lookup('Overview tab', page.locator('button[role="tab"] >> text=Overview').first.click())
+        await wait_for_tab(page, 'Overview')
     except: desc = ""
 
     if desc == "":
@@ -71,16 +178,18 @@ async def get_description(page):
         except: desc = ""
 
     if desc == "":
-        try: desc = await page.locator('.MmD1mb.fontBodyMedium, .WeS02d.fontBodyMedium .PYvSYb, .bwoZTb.fontBodyMedium').first.inner_text(timeout=1000)
+        try:
+            selector = '.MmD1mb.fontBodyMedium, .WeS02d.fontBodyMedium .PYvSYb, .bwoZTb.fontBodyMedium'
+            desc = await lookup(selector, page.locator(selector).first.inner_text(timeout=1000))
         except: desc = ""
 
     return desc
 
 
 async def get_link(page):
-    try: link = await page.locator('a[data-item-id="authority"]').first.get_attribute('href', timeout=1000)
+    try: link = await lookup('a[data-item-id="authority"]', page.locator('a[data-item-id="authority"]').first.get_attribute('href', timeout=1000))
     except:
-        try: link = await page.locator('.SlvSdc.co54Ed.e3R2ac').first.get_attribute('href', timeout=1000)
+        try: link = await lookup('.SlvSdc.co54Ed.e3R2ac', page.locator('.SlvSdc.co54Ed.e3R2ac').first.get_attribute('href', timeout=1000))
         except: link = None
 
     return link
@@ -88,18 +197,18 @@ async def get_link(page):
 
 async def get_rating(page):
     try:
-        rating = await page.locator('.F7nice span[aria-hidden="true"]').first.inner_text(timeout=1000)
+        rating = await lookup('.F7nice span[aria-hidden="true"]', page.locator('.F7nice span[aria-hidden="true"]').first.inner_text(timeout=1000))
     except: rating = None
 
     return rating
 
 
 async def get_rating_count(page):
-    try: rating_count_text = await page.locator('span[aria-label*=" reviews"]').first.get_attribute('aria-label', timeout=1000)
+    try: rating_count_text = await lookup('span[aria-label*=" reviews"]', page.locator('span[aria-label*=" reviews"]').first.get_attribute('aria-label', timeout=1000))
     except: rating_count_text = None
 
     if rating_count_text is None:
-        try: rating_count_text = await page.locator('.Bd93Zb .HHrUdb span').first.inner_text(timeout=1000)
+        try: rating_count_text = await lookup('.Bd93Zb .HHrUdb span', page.locator('.Bd93Zb .HHrUdb span').first.inner_text(timeout=1000))
         except: rating_count_text = None
 
     # if rating_count_text is None:
@@ -143,14 +252,14 @@ async def get_lon(page):
 
 async def get_phone(page):
     try:
-        phone = await page.locator('button[data-item-id*="phone"]').locator('.Io6YTe').first.inner_text(timeout=1000)
+        phone = await lookup('button[data-item-id*="phone"] .Io6YTe', page.locator('button[data-item-id*="phone"]').locator('.Io6YTe').first.inner_text(timeout=1000))
     except: phone = None
 
     return phone
 
 
 async def get_address(page):
-    try: address = await page.locator('button[data-item-id="address"]').locator('.Io6YTe').first.inner_text(timeout=1000)
+    try: address = await lookup('button[data-item-id="address"] .Io6YTe', page.locator('button[data-item-id="address"]').locator('.Io6YTe').first.inner_text(timeout=1000))
     except: address = None
 
     return address
@@ -158,7 +267,7 @@ async def get_address(page):
 
 async def get_stars(page):
     try:
-        stars_el = await page.locator('span', has_text='star hotel').first.text_content(timeout=1000)
+        stars_el = await lookup('span:has-text("star hotel")', page.locator('span', has_text='star hotel').first.text_content(timeout=1000))
         stars = parse_stars(stars_el)
     except: stars = None
 
@@ -166,11 +275,11 @@ async def get_stars(page):
 
 
 async def get_images(page):
-    try: img = await page.locator('img[src*="googleusercontent.com"]').first.get_attribute('src', timeout=1000)
+    try: img = await lookup('img[src*="googleusercontent.com"]', page.locator('img[src*="googleusercontent.com"]').first.get_attribute('src', timeout=1000))
     except: img = None
 
     if not img:
-        try: img = await page.locator('img[src*="streetviewpixels-pa.googleapis.com"]').first.get_attribute('src', timeout=1000)
+        try: img = await lookup('img[src*="streetviewpixels-pa.googleapis.com"]', page.locator('img[src*="streetviewpixels-pa.googleapis.com"]').first.get_attribute('src', timeout=1000))
         except: img = None
 
     if img:
@@ -180,11 +289,11 @@ async def get_images(page):
 
 
 async def get_price(page):
-    try: price = await page.locator('[aria-label*="$"], [aria-label*="R$"], [aria-label*="€"]').first.get_attribute('aria-label', timeout=1000)
+    try: price = await lookup('[aria-label*="$"], [aria-label*="R$"], [aria-label*="€"]', page.locator('[aria-label*="$"], [aria-label*="R$"], [aria-label*="€"]').first.get_attribute('aria-label', timeout=1000))
     except:
-        try: price = await page.locator('.drwWxc, .NFP9ae').first.inner_text(timeout=1000)
+        try: price = await lookup('.drwWxc, .NFP9ae', page.locator('.drwWxc, .NFP9ae').first.inner_text(timeout=1000))
         except:
-            try: price = await page.locator('.MNVeJb div').first.inner_text(timeout=1000)
+            try: price = await lookup('.MNVeJb div', page.locator('.MNVeJb div').first.inner_text(timeout=1000))
             except: price = None
 
     if price: price = parse_price(price)
@@ -194,12 +303,12 @@ async def get_price(page):
 
 async def get_facilities(page):
     try:
-        await page.locator('button[role="tab"] >> text=About').first.click()
-        await page.wait_for_timeout(1000)
+        await lookup('About tab', page.locator('button[role="tab"] >> text=About').first.click())
+        await wait_for_tab(page, 'About', ABOUT_PANEL_SELECTOR)
         facility_els = await page.locator('.CK16pd.dc6iWb, .iNvpkb.SwaGS span[aria-label]').all()
         facilities = [await f.get_attribute('aria-label', timeout=1000) for f in facility_els]
-        await page.locator('button[role="tab"] >> text=Overview').first.click()
-        await page.wait_for_timeout(1000)
+        await lookup('Overview tab', page.locator('button[role="tab"] >> text=Overview').first.click())
+        await wait_for_tab(page, 'Overview')
     except: facilities = []
 
     if not facilities:
@@ -0,0 +1,69 @@
+import os
+import metrics
+
+
+# psutil is optional, without it the RSS is read from /proc (Linux), elsewhere it is reported as unknown
+try: import psutil
+except ImportError: psutil = None
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+MB = 1024 * 1024
+
+
+def _proc_rss(pid):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError): return 0
+
+
+def _proc_children(pid):
+    # Parent of every process from /proc/<pid>/stat, then the whole tree below pid
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit(): continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError: continue
+        # The command name may contain spaces, the fields after it start at the last ')'
+        parents.setdefault(int(stat.rsplit(')', 1)[1].split()[1]), []).append(int(entry))
+
+    tree, pending = [], [pid]
+    while pending:
+        children = parents.get(pending.pop(), [])
+        tree += children
+        pending += children
+    return tree
+
+
+def python_rss():
+    """RSS of this process in bytes, None when it can not be read"""
+    if psutil: return psutil.Process().memory_info().rss
+    if os.path.exists('/proc/self/statm'): return _proc_rss('self')
+    return None
+
+
+def browser_rss():
+    """RSS in bytes of every process started by this one (Playwright driver and Chromium processes)"""
+    if psutil:
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try: total += child.memory_info().rss
+            except psutil.Error: pass
+        return total
+    if os.path.exists('/proc/self/statm'): return sum(_proc_rss(child) for child in _proc_children(os.getpid()))
+    return None
+
+
+def record_rss(**labels):
+    # Samples both RSS values into the rss_bytes gauge, returns them in MB (None when unknown)
+    python, browser = python_rss(), browser_rss()
+    if python is not None: metrics.set_gauge('rss_bytes', python, process='python', **labels)
+    if browser is not None: metrics.set_gauge('rss_bytes', browser, process='browser', **labels)
+    return tuple(value / MB if value is not None else None for value in (python, browser))
+
+
+def describe_rss(python_mb, browser_mb):
+    def text(value): return f'{value:.0f} MB' if value is not None else 'unknown'
+    return f"RSS: python {text(python_mb)}, browser {text(browser_mb)}"
@@ -0,0 +1,131 @@
+import re
+import time
+from difflib import SequenceMatcher
+from DatabaseManager import DatabaseManager
+from options import get_option, get_positional
+from parsers import parse_name_key, parse_place_id
+
+
+RADIUS_M = 75  # Places with matching names closer than this are the same place, overridable with --radius=N
+SIMILARITY = 0.9  # Minimum name similarity (0-1) after normalization, overridable with --similarity=N
+
+# Identity columns are kept from the surviving record, every other empty column is filled from its duplicates
+IDENTITY_COLUMNS = ['id', 'product_type', 'place_id']
+
+
+def same_name(key, other_key, similarity):
+    if not key or not other_key: return False
+    if key == other_key: return True
+    # Numbers tell branches apart ("Bar 1" and "Bar 11", "Hotel Ibis 2"), they must match exactly
+    if re.findall(r'\d+', key) != re.findall(r'\d+', other_key): return False
+    return SequenceMatcher(None, key, other_key).ratio() >= similarity
+
+
+def find_duplicate_groups(db, radius_m, similarity, product_type=None):
+    # One index lookup per record (O(n log n)), each pair is compared once from its lowest id
+    parent = {}
+
+    def find(record_id):
+        root = record_id
+        while parent.get(root, root) != root: root = parent[root]
+        while parent.get(record_id, record_id) != root:
+            parent[record_id], record_id = root, parent[record_id]
+        return root
+
+    sql = "SELECT id, product_type, name, latitude, longitude FROM products WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    params = []
+    if product_type:
+        sql += " AND product_type=?"
+        params.append(product_type)
+
+    for row in db.iter_query(sql + " ORDER BY id", params):
+        key = parse_name_key(row['name'])
+        if not key: continue
+
+        for other in db.find_nearby(row['latitude'], row['longitude'], radius_m, row['product_type']):
+            if other['id'] <= row['id'] or not same_name(key, parse_name_key(other['name']), similarity): continue
+            parent[find(other['id'])] = find(row['id'])
+
+    groups = {}
+    for record_id in parent:
+        groups.setdefault(find(record_id), set()).add(record_id)
+    for root, members in groups.items():
+        members.add(root)
+    return [sorted(members) for members in groups.values()]
+
+
+def is_empty(value):
+    return value is None or value == ''
+
+
+def merge_group(db, ids):
+    # The most complete record survives (the most recently scraped on a tie), its gaps are filled by the others
+    placeholders = ', '.join(['?' for _ in ids])
+    rows = db.get(f"SELECT * FROM products WHERE id IN ({placeholders})", ids)
+    if len(rows) < 2: return None
+
+    def completeness(row):
+        filled = len([column for column, value in row.items() if not is_empty(value)])
+        return filled, row.get('scraped_at') or '', -row['id']
+
+    rows.sort(key=completeness, reverse=True)
+    keeper, duplicates = rows[0], rows[1:]
+
+    filled = {}
+    for column, value in keeper.items():
+        if column in IDENTITY_COLUMNS or not is_empty(value): continue
+        for duplicate in duplicates:
+            if not is_empty(duplicate.get(column)):
+                filled[column] = duplicate[column]
+                break
+
+    # The unique (place_id, product_type) key must survive the merge, otherwise the next scrape of the place
+    # inserts a new duplicate. It is set after the DELETE, while a duplicate still holds it the index rejects it
+    place_id = keeper.get('place_id') or parse_place_id(keeper.get('card_href'))
+    if not place_id: place_id = next((duplicate['place_id'] for duplicate in duplicates if duplicate.get('place_id')), None)
+
+    with db.transaction():
+        if filled: db.update(keeper['id'], filled)
+        db.execute(
+            f"DELETE FROM products WHERE id IN ({', '.join(['?' for _ in duplicates])})",
+            [duplicate['id'] for duplicate in duplicates]
+        )
+        if place_id and place_id != keeper.get('place_id'):
+            db.update(keeper['id'], {'place_id': place_id})
+            keeper['place_id'] = place_id
+
+    return keeper, duplicates
+
+
+def main():
+    # Usage: python merge_duplicates.py [product type] [--radius=75] [--similarity=0.9] [--db=path] [--dry-run]
+    positional = get_positional()
+    product_type = positional[0] if positional else None
+    radius_m = get_option('radius', RADIUS_M, float)
+    similarity = get_option('similarity', SIMILARITY, float)
+    dry_run = get_option('dry-run')
+
+    db = DatabaseManager(get_option('db', 'products.db'), persistent=True)
+    start = time.time()
+    groups = find_duplicate_groups(db, radius_m, similarity, product_type)
+    print(f"Duplicate groups found: {len(groups)} ({sum(len(group) for group in groups)} records) in {time.time() - start:.2f} seconds")
+
+    merged = 0
+    for ids in groups:
+        if dry_run:
+            names = [row['name'] for row in db.get(f"SELECT name FROM products WHERE id IN ({', '.join(['?' for _ in ids])})", ids)]
+            print(f"Would merge {ids}: {names}")
+            continue
+
+        result = merge_group(db, ids)
+        if not result: continue
+        keeper, duplicates = result
+        merged += len(duplicates)
+        print(f"Merged {[duplicate['id'] for duplicate in duplicates]} into {keeper['id']}: {keeper['name']}")
+
+    db.close()
+    if not dry_run: print(f"Records removed: {merged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the histogram buckets, the last bucket (+Inf) is implicit
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PREFIX = 'scraper_'
+
+# Series recorded since the last flush (one term) and the totals of the whole run
+PERIOD = {'histograms': {}, 'counters': {}, 'gauges': {}}
+TOTALS = {'histograms': {}, 'counters': {}, 'gauges': {}}
+OUTPUTS = {'jsonl': None, 'prometheus': None}
+
+# Observations also come from the DB writer thread
+_lock = threading.Lock()
+
+
+def configure(jsonl_path=None, prometheus_path=None):
+    # Files written by flush, None disables the output
+    OUTPUTS['jsonl'] = jsonl_path
+    OUTPUTS['prometheus'] = prometheus_path
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _new_histogram():
+    return {'buckets': [0] * (len(BUCKETS) + 1), 'count': 0, 'sum': 0.0, 'max': 0.0}
+
+
+def observe(name, value, **labels):
+    index = next((i for i, bound in enumerate(BUCKETS) if value <= bound), len(BUCKETS))
+    with _lock:
+        histogram = PERIOD['histograms'].setdefault(_key(name, labels), _new_histogram())
+        histogram['buckets'][index] += 1
+        histogram['count'] += 1
+        histogram['sum'] += value
+        histogram['max'] = max(histogram['max'], value)
+
+
+def increment(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        PERIOD['counters'][key] = PERIOD['counters'].get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    # Last value wins, used for levels such as memory that are sampled instead of accumulated
+    with _lock:
+        PERIOD['gauges'][_key(name, labels)] = value
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.time()
+    try: yield
+    finally: observe(name, time.time() - start, **labels)
+
+
+def series(name, totals=False):
+    # Histograms recorded under name as a list of (labels, histogram)
+    source = TOTALS if totals else PERIOD
+    return [(dict(labels), histogram) for (key, labels), histogram in source['histograms'].items() if key == name]
+
+
+def quantile(histogram, q):
+    # Estimated from the buckets, returns the upper bound of the bucket holding the quantile
+    if not histogram['count']: return 0
+    target = q * histogram['count']
+    seen = 0
+    for bound, count in zip(BUCKETS, histogram['buckets']):
+        seen += count
+        if seen >= target: return min(bound, histogram['max'])
+    return histogram['max']
+
+
+def _label_text(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs: return ''
+    escaped = [(key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in pairs]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def prometheus_text():
+    lines = []
+    typed = set()
+    for (name, labels), histogram in sorted(TOTALS['histograms'].items()):
+        metric = PREFIX + name
+        if metric not in typed:
+            lines.append(f'# TYPE {metric} histogram')
+            typed.add(metric)
+        cumulative = 0
+        for bound, count in zip(list(BUCKETS) + ['+Inf'], histogram['buckets']):
+            cumulative += count
+            lines.append(f'{metric}_bucket{_label_text(labels, ("le", str(bound)))} {cumulative}')
+        lines.append(f'{metric}_sum{_label_text(labels)} {histogram["sum"]:.6f}')
+        lines.append(f'{metric}_count{_label_text(labels)} {histogram["count"]}')
+
+    for (name, labels), value in sorted(TOTALS['counters'].items()):
+        metric = PREFIX + name
+        if metric not in typed:
+            lines.append(f'# TYPE {metric} counter')
+            typed.add(metric)
+        lines.append(f'{metric}{_label_text(labels)} {value}')
+
+    for (name, labels), value in sorted(TOTALS['gauges'].items()):
+        metric = PREFIX + name
+        if metric not in typed:
+            lines.append(f'# TYPE {metric} gauge')
+            typed.add(metric)
+        lines.append(f'{metric}{_label_text(labels)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    # Written to a temporary file and renamed, the textfile collector never reads a half written file
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def write_jsonl(path, **context):
+    # One line per series recorded in the period, tagged with the context (product type, location, term...)
+    ts = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    with open(path, 'a', encoding='utf-8') as f:
+        for (name, labels), histogram in PERIOD['histograms'].items():
+            f.write(json.dumps({
+                'ts': ts, **context, 'metric': name, 'type': 'histogram', 'labels': dict(labels),
+                'count': histogram['count'], 'sum': round(histogram['sum'], 6), 'max': round(histogram['max'], 6),
+                'p50': quantile(histogram, 0.5), 'p90': quantile(histogram, 0.9), 'p99': quantile(histogram, 0.99),
+                'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], histogram['buckets']))
+            }) + '\n')
+        for (name, labels), value in PERIOD['counters'].items():
+            f.write(json.dumps({'ts': ts, **context, 'metric': name, 'type': 'counter', 'labels': dict(labels), 'value': value}) + '\n')
+        for (name, labels), value in PERIOD['gauges'].items():
+            f.write(json.dumps({'ts': ts, **context, 'metric': name, 'type': 'gauge', 'labels': dict(labels), 'value': value}) + '\n')
+
+
+def flush(**context):
+    """Writes the period to the JSON-lines file, adds it to the run totals exported to the Prometheus textfile
+    and starts a new period"""
+    with _lock:
+        _flush(context)
+
+
+def _flush(context):
+    if OUTPUTS['jsonl']: write_jsonl(OUTPUTS['jsonl'], **context)
+
+    for key, histogram in PERIOD['histograms'].items():
+        total = TOTALS['histograms'].setdefault(key, _new_histogram())
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+        total['count'] += histogram['count']
+        total['sum'] += histogram['sum']
+        total['max'] = max(total['max'], histogram['max'])
+    for key, value in PERIOD['counters'].items():
+        TOTALS['counters'][key] = TOTALS['counters'].get(key, 0) + value
+    TOTALS['gauges'].update(PERIOD['gauges'])
+
+    if OUTPUTS['prometheus']: write_prometheus(OUTPUTS['prometheus'])
+    PERIOD['histograms'].clear()
+    PERIOD['counters'].clear()
+    PERIOD['gauges'].clear()
+
+
+def print_summary(names=None, totals=False):
+    # Slowest series first, so the getter or selector eating the time is at the top
+    source = TOTALS if totals else PERIOD
+    rows = [(name, labels, histogram) for (name, labels), histogram in source['histograms'].items() if not names or name in names]
+    for name, labels, histogram in sorted(rows, key=lambda row: row[2]['sum'], reverse=True):
+        label = ','.join(f'{key}={value}' for key, value in labels)
+        print(
+            f"{name}{f'[{label}]' if label else ''}: {histogram['count']} x {histogram['sum'] / histogram['count']:.3f}s avg, "
+            f"p90 {quantile(histogram, 0.9):.3f}s, {histogram['sum']:.2f}s total"
+        )
+
+    counters = [(name, labels, value) for (name, labels), value in source['counters'].items() if not names or name in names]
+    for name, labels, count in sorted(counters, key=lambda row: row[2], reverse=True):
+        label = ','.join(f'{key}={value}' for key, value in labels)
+        print(f"{name}{f'[{label}]' if label else ''}: {count}")
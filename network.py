@@ -0,0 +1,78 @@
+BLOCK_PROFILES = {
+    # The getters only read DOM text, attributes and page.url, so nothing below is needed to scrape
+    'default': {
+        'resource_types': ['image', 'font', 'media'],
+        'url_patterns': [
+            '/maps/vt', 'khms', '/kh/v', '/maps/preview/pegman', 'streetviewpixels',  # map tiles
+            '/gen_204', '/log?', '/csi?', '/jserror', 'play.google.com/log',  # telemetry
+            'googletagmanager.com', 'google-analytics.com', 'doubleclick.net'
+        ],
+        'allow_patterns': ['consent.google.com', 'consent.youtube.com', '/maps/preview/place']
+    },
+    'off': None
+}
+
+_BLOCKERS = {}
+
+
+class RequestBlocker:
+    """Aborts heavy requests through page.route and counts what was blocked and loaded
+
+    The loaded bytes are estimated from the content-length header delivered with each response, asking
+    the browser for the exact sizes costs a protocol round trip per request. Chunked responses without
+    the header are not counted"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.blocked = 0
+        self.blocked_by_type = {}
+        self.allowed = 0
+        self.bytes_loaded = 0
+
+    def should_block(self, url, resource_type):
+        if any(pattern in url for pattern in self.profile['allow_patterns']): return False
+        if resource_type in self.profile['resource_types']: return True
+        return any(pattern in url for pattern in self.profile['url_patterns'])
+
+    async def handle(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked += 1
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            await route.abort()
+            return
+
+        self.allowed += 1
+        await route.continue_()
+
+    def on_response(self, response):
+        try: self.bytes_loaded += int(response.headers.get('content-length', 0))
+        except ValueError: pass
+
+    def snapshot(self):
+        return {'blocked': self.blocked, 'allowed': self.allowed, 'bytes_loaded': self.bytes_loaded}
+
+    def describe_since(self, before):
+        blocked = self.blocked - before['blocked']
+        allowed = self.allowed - before['allowed']
+        loaded = (self.bytes_loaded - before['bytes_loaded']) / 1024
+        return f"Requests blocked: {blocked}, allowed: {allowed}, loaded: ~{loaded:.0f} KB"
+
+
+async def attach_blocker(page, profile_name='default'):
+    profile = BLOCK_PROFILES.get(profile_name)
+    if not profile: return None
+
+    blocker = RequestBlocker(profile)
+    await page.route('**/*', blocker.handle)
+    page.on('response', blocker.on_response)
+    _BLOCKERS[page] = blocker
+    return blocker
+
+
+def blocker_for(page):
+    return _BLOCKERS.get(page)
+
+
+def detach_blocker(page):
+    return _BLOCKERS.pop(page, None)
@@ -0,0 +1,14 @@
+import sys
+
+
+def get_option(name, default=None, cast=str):
+    # Reads "--name=value" (or a bare "--name" flag) from the command line
+    for arg in sys.argv[1:]:
+        if arg == f'--{name}': return True
+        if arg.startswith(f'--{name}='): return cast(arg.split('=', 1)[1])
+    return default
+
+
+def get_positional():
+    # Command line arguments that are not --options
+    return [arg for arg in sys.argv[1:] if not arg.startswith('--')]
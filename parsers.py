@@ -1,16 +1,21 @@
 import re
+import unicodedata
+from urllib.parse import unquote
 
 
 def parse_rating_count(value):
     if isinstance(value, int): return value
 
     if isinstance(value, str):
-        if "k" in value:
-            match = re.match(r"(\d+)(?:k\+)?", value)
-            if match: return int(match.group(1)) * 1000
+        # Compact counts shown on the cards: "(1.2K)", "3k+", "1,5M"
+        match = re.search(r'(\d+(?:[.,]\d+)?)\s*([kKmM])(?![a-zA-Z])', value)
+        if match:
+            multiplier = 1000 if match.group(2).lower() == 'k' else 1000000
+            return int(round(float(match.group(1).replace(',', '.')) * multiplier))
 
-        match = re.search(r'\d{1,3}(?:,\d{3})*', value)
-        if match: return int(match.group(0).replace(',', ''))
+        # Thousands separated by ',' (en) or '.' (pt-BR)
+        match = re.search(r'\d{1,3}(?:[,.]\d{3})*', value)
+        if match: return int(re.sub(r'[,.]', '', match.group(0)))
 
         try: return int(value)
         except (ValueError, TypeError): return None
@@ -40,3 +45,25 @@ def parse_stars(value):
     if not text: return None
     return text.group()
 
+
+def parse_place_id(value):
+    # Normalizes a card_href into a stable place id, query string and viewport parts vary between searches
+    if not value: return None
+
+    match = re.search(r'!1s(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)', value)
+    if match: return match.group(1).lower()
+
+    match = re.search(r'!16s([^!?&]+)', value)
+    if match: return unquote(match.group(1))
+
+    return value.split('?')[0].rstrip('/')
+
+
+def parse_name_key(value):
+    # Lowercase name without accents, punctuation and repeated spaces, used to compare names of nearby places
+    if not value: return None
+
+    text = unicodedata.normalize('NFKD', value)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip() or None
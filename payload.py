@@ -0,0 +1,178 @@
+import asyncio
+import json
+import re
+import sys
+from urllib.parse import urlparse, parse_qs
+from parsers import parse_price
+
+
+# Responses carrying the place data: the preview/place XHR of in-app navigations and the document itself,
+# whose APP_INITIALIZATION_STATE embeds the same payload on a direct page load
+PLACE_RESPONSE_PATTERN = '/maps/preview/place'
+XSSI_PREFIX = ")]}'"
+
+# Position of each column inside the place array (payload[6]), alternatives are tried in order
+PLACE_FIELDS = {
+    'name': [(11,)],
+    'rating': [(4, 7)],
+    'rating_count': [(4, 8)],
+    'phone': [(178, 0, 0), (178, 0, 3)],
+    'address': [(39,), (18,)],
+    'link': [(7, 0)],
+    'latitude': [(9, 2)],
+    'longitude': [(9, 3)],
+    'price': [(4, 2)],
+}
+PAYLOAD_COLUMNS = list(PLACE_FIELDS)
+PLACE_ID_PATH = (10,)  # Feature id ("0x...:0x...") of the place, the same id parse_place_id reads from a card_href
+FEATURE_ID_PATTERN = re.compile(r'0x[0-9a-f]+:0x[0-9a-f]+')
+
+_CAPTURES = {}
+
+
+def decode_payload(text):
+    # Strips the anti-XSSI prefix and returns the decoded JSON, or None when the text is not a place payload
+    if not text: return None
+    text = text.strip()
+    if text.startswith(XSSI_PREFIX): text = text[len(XSSI_PREFIX):]
+
+    try: return json.loads(text)
+    except ValueError: return None
+
+
+def decode_document(html):
+    # Extracts the place payload embedded in the APP_INITIALIZATION_STATE of a place page
+    match = re.search(r'APP_INITIALIZATION_STATE=(\[.*?\]);window\.APP_', html or '', re.S)
+    if not match: return None
+
+    try: state = json.loads(match.group(1))
+    except ValueError: return None
+
+    candidates = state[3] if len(state) > 3 and isinstance(state[3], list) else []
+    for candidate in candidates:
+        if isinstance(candidate, str) and candidate.startswith(XSSI_PREFIX):
+            payload = decode_payload(candidate)
+            if place_array(payload): return payload
+
+    return None
+
+
+def place_array(payload):
+    if isinstance(payload, list) and len(payload) > 6 and isinstance(payload[6], list): return payload[6]
+    return None
+
+
+def payload_place_id(payload):
+    place_id = pick(place_array(payload), PLACE_ID_PATH)
+    return place_id.lower() if isinstance(place_id, str) else None
+
+
+def pick(data, path):
+    for index in path:
+        if not isinstance(data, list) or index >= len(data): return None
+        data = data[index]
+    return data
+
+
+def parse_place(payload):
+    """Decodes the columns of PLACE_FIELDS from a place payload, missing or malformed fields are left out"""
+    data = place_array(payload)
+    if data is None: return {}
+
+    place = {}
+    for column, paths in PLACE_FIELDS.items():
+        for path in paths:
+            value = clean(column, pick(data, path), place)
+            if value is not None:
+                place[column] = value
+                break
+
+    return place
+
+
+def clean(column, value, place):
+    if value is None or value == '' or isinstance(value, list): return None
+
+    try:
+        if column in ('rating', 'latitude', 'longitude'): return float(value)
+        if column == 'rating_count': return int(value)
+    except (TypeError, ValueError): return None
+
+    if not isinstance(value, str): return None
+
+    if column == 'address' and place.get('name') and value.startswith(place['name'] + ','):
+        value = value[len(place['name']) + 1:]
+    if column == 'link' and value.startswith('/url?'):
+        value = parse_qs(urlparse(value).query).get('q', [None])[0]
+    if column == 'price': value = parse_price(value)
+
+    return value.strip() if value else None
+
+
+class PayloadCapture:
+    """Keeps the last place payload received by a page through page.on('response')"""
+
+    def __init__(self):
+        self.payload = None
+        self.place_id = None
+        self.ignored = 0
+        self._received = asyncio.Event()
+
+    def reset(self, place_id=None):
+        # Called before each navigation so a payload of the previous place is never used. With a place_id only
+        # the payload of that place is kept: late responses of the previous place and previews of related
+        # places arrive on the same page. Other ids parse_place_id falls back to (a /g/ id or the bare URL) never
+        # match the payload, those places keep every payload
+        place_id = place_id.lower() if place_id else None
+        self.payload = None
+        self.place_id = place_id if place_id and FEATURE_ID_PATTERN.fullmatch(place_id) else None
+        self._received.clear()
+
+    async def on_response(self, response):
+        try:
+            if PLACE_RESPONSE_PATTERN in response.url:
+                payload = decode_payload(await response.text())
+            elif response.request.resource_type == 'document' and '/maps/place/' in response.url:
+                payload = decode_document(await response.text())
+            else: return
+        except: return
+
+        if place_array(payload) is None: return
+        if self.place_id and payload_place_id(payload) != self.place_id:
+            self.ignored += 1
+            return
+
+        self.payload = payload
+        self._received.set()
+
+    async def wait(self, timeout=2.0):
+        # Returns the payload of the current place, or None when it did not arrive within timeout seconds
+        if self.payload is None:
+            try: await asyncio.wait_for(self._received.wait(), timeout)
+            except asyncio.TimeoutError: pass
+        return self.payload
+
+
+def capture_for(page):
+    # One capture per page, the response listener is attached on first use
+    capture = _CAPTURES.get(page)
+    if capture is None:
+        capture = PayloadCapture()
+        page.on('response', capture.on_response)
+        _CAPTURES[page] = capture
+    return capture
+
+
+def detach_capture(page):
+    # Drops the capture of a closed page so its payloads are not kept alive
+    return _CAPTURES.pop(page, None)
+
+
+if __name__ == "__main__":
+    # Decodes a saved payload (preview/place response or place page HTML) offline:
+    # python payload.py benchmark/fixtures/place_payload.txt
+    with open(sys.argv[1], encoding='utf-8') as f:
+        text = f.read()
+
+    decoded = decode_payload(text) if not text.lstrip().startswith('<') else decode_document(text)
+    print(json.dumps(parse_place(decoded), indent=2, ensure_ascii=False))
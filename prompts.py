@@ -0,0 +1,38 @@
+import hashlib
+import json
+
+
+MODEL = "gemini-2.5-flash-lite"
+DESCRIPTION_LIMITS = (100, 400)
+
+# Generic text Google shows for places without a description, treated as a missing description
+PLACEHOLDER_DESCRIPTION = 'Based on sightseeing, recreation, and getting around'
+
+
+def build_prompt(card_href):
+    return (
+        f'Vasculhe as reviews da ficha deste negócio do Google Maps ({card_href}), e gere um texto de descrição promocional curto e persuasivo para esse local, citando diferenciais e elogios recorrentes (em inglês). O retorno deve ser apenas da descrição em texto simples, sem simbolos, HTML ou parágrafos. O retorno também deve ter no mínimo 100 caracteres e no máximo 400 caracteres.'
+    )
+
+
+def build_batch_prompt(registries):
+    businesses = [
+        {
+            'id': registry.get('id'),
+            'name': registry.get('name'),
+            'card_href': registry.get('card_href'),
+            'facilities': registry.get('facilities'),
+            'rating': registry.get('rating')
+        }
+        for registry in registries
+    ]
+    return (
+        f'Para cada negócio do Google Maps da lista JSON abaixo, vasculhe as reviews da ficha (card_href) e gere um texto de descrição promocional curto e persuasivo para esse local, citando diferenciais e elogios recorrentes (em inglês). Cada descrição deve ser apenas texto simples, sem simbolos, HTML ou parágrafos, com no mínimo {DESCRIPTION_LIMITS[0]} caracteres e no máximo {DESCRIPTION_LIMITS[1]} caracteres. O retorno deve ser apenas um array JSON com um objeto {{"id": <id>, "description": "<descrição>"}} para cada negócio.\n'
+        + json.dumps(businesses, ensure_ascii=False)
+    )
+
+
+# Changes whenever the model or any prompt template changes, so cached descriptions of an old prompt are not reused
+PROMPT_VERSION = hashlib.sha1(
+    '\n'.join([MODEL, build_prompt('{card_href}'), build_batch_prompt([])]).encode('utf-8')
+).hexdigest()[:12]
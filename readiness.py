@@ -0,0 +1,108 @@
+import time
+import metrics
+
+
+CARD_SELECTOR = 'div.Nv2PK.THOPZb.CpccDe'
+ABOUT_PANEL_SELECTOR = '.iP2t7d, .P1LL5e, .HlvSq, .CK16pd, .iNvpkb'
+END_OF_LIST_SELECTOR = 'div[role="feed"] .HlvSq'
+
+# Fixed sleeps each wait replaced, in seconds, used to report the time we get back
+FIXED_SLEEPS = {'place': 1.3, 'tab': 1.0, 'feed': 1.2, 'scroll': 3.0}
+
+
+def record_wait(name, elapsed, ready=True):
+    metrics.observe('wait_seconds', elapsed, wait=name)
+    if not ready: metrics.increment('wait_timeouts_total', wait=name)
+
+
+async def wait_until(page, name, condition, arg=None, timeout=5000):
+    # Polls a JS condition until it is truthy or the ceiling timeout (ms) is hit, returns whether it became ready
+    start = time.time()
+    try:
+        await page.wait_for_function(condition, arg=arg, timeout=timeout)
+        ready = True
+    except: ready = False
+
+    record_wait(name, time.time() - start, ready)
+    return ready
+
+
+async def wait_for_place(page, timeout=5000):
+    # Detail page is ready once the title is rendered together with the rating block or the info buttons
+    return await wait_until(page, 'place', """() => {
+        const title = document.querySelector('h1.DUwDvf, h1');
+        if (!title || !title.innerText.trim()) return false;
+        return document.querySelector('.F7nice, button[data-item-id]') !== null;
+    }""", timeout=timeout)
+
+
+async def wait_for_tab(page, tab, panel_selector=None, timeout=3000):
+    # Tab switch is done once the tab is selected and, when given, its panel has content
+    return await wait_until(page, 'tab', """([tab, panelSelector]) => {
+        const button = Array.from(document.querySelectorAll('button[role="tab"]')).find(b => b.innerText.includes(tab));
+        if (!button || button.getAttribute('aria-selected') !== 'true') return false;
+        return !panelSelector || document.querySelector(panelSelector) !== null;
+    }""", arg=[tab, panel_selector], timeout=timeout)
+
+
+async def wait_for_feed(page, timeout=8000):
+    return await wait_until(page, 'feed', """(cardSelector) => {
+        const feed = document.querySelector('div[role="feed"]');
+        return feed !== null && feed.querySelector(cardSelector) !== null;
+    }""", arg=CARD_SELECTOR, timeout=timeout)
+
+
+# Scrolls the feed to the bottom and resolves on the first mutation that adds cards or shows the end-of-list
+# marker (or on the timeout), returning the new card hrefs in the same round trip
+SCROLL_FEED_SCRIPT = """async ([cardSelector, endSelector, prevCount, timeout]) => {
+    const feed = document.querySelector('div[role="feed"]');
+    if (!feed) return {count: prevCount, ended: true, changed: false, hrefs: []};
+
+    const state = () => {
+        const cards = feed.querySelectorAll(cardSelector);
+        return {count: cards.length, ended: document.querySelector(endSelector) !== null, cards};
+    };
+    const result = (now, changed) => ({
+        count: now.count,
+        ended: now.ended,
+        changed,
+        hrefs: Array.from(now.cards).slice(prevCount).map(card => {
+            const link = card.querySelector('a.hfpxzc');
+            return link ? link.getAttribute('href') : null;
+        })
+    });
+
+    feed.scrollTop = feed.scrollHeight;
+    const current = state();
+    if (current.count !== prevCount || current.ended) return result(current, true);
+
+    return await new Promise(resolve => {
+        const observer = new MutationObserver(() => {
+            const now = state();
+            if (now.count === prevCount && !now.ended) return;
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(result(now, true));
+        });
+        const timer = setTimeout(() => { observer.disconnect(); resolve(result(state(), false)); }, timeout);
+        observer.observe(feed, {childList: true, subtree: true});
+    });
+}"""
+
+
+async def scroll_feed(page, prev_count, timeout=3000):
+    # Returns {count, ended, changed, hrefs} where hrefs are the cards loaded after prev_count
+    start = time.time()
+    try: state = await page.evaluate(SCROLL_FEED_SCRIPT, [CARD_SELECTOR, END_OF_LIST_SELECTOR, prev_count, timeout])
+    except: state = {'count': prev_count, 'ended': False, 'changed': False, 'hrefs': []}
+
+    record_wait('scroll', time.time() - start, state['changed'])
+    return state
+
+
+def print_wait_summary(totals=False):
+    # Waits recorded in the current metrics period (or the whole run), compared with the fixed sleeps they replaced
+    for labels, histogram in metrics.series('wait_seconds', totals):
+        name, count, spent = labels['wait'], histogram['count'], histogram['sum']
+        saved = FIXED_SLEEPS.get(name, 0) * count - spent
+        print(f"Wait '{name}': {count} waits, {spent / count:.2f}s avg, {spent:.2f}s total, {saved:.2f}s saved vs fixed sleeps")
@@ -1,4 +1,4 @@
 #!/bin/bash
 cd /home/scraper
 source .venv/bin/activate
-python3 create_description_with_ai.py
+python3 create_description_with_ai.py "$@"
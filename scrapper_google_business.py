@@ -1,10 +1,38 @@
 import asyncio
-import sys
+import os
+import socket
 import time
+import memory
+import metrics
+from BrowserSession import BrowserSession
 from DatabaseManager import DatabaseManager
+from DatabaseWriter import DatabaseWriter
+from DescriptionCache import DescriptionCache
+from JobManager import JobManager
+from RefreshScheduler import RefreshScheduler
+from TermScheduler import TermScheduler
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
-from getters import get_property
-
+from getters import get_property, get_snapshot, get_cards, SNAPSHOT_COLUMNS
+from network import blocker_for, BLOCK_PROFILES
+from options import get_option, get_positional
+from parsers import parse_place_id
+from payload import capture_for, parse_place
+from prompts import PLACEHOLDER_DESCRIPTION, PROMPT_VERSION
+from readiness import wait_for_place, wait_for_feed, scroll_feed, print_wait_summary, CARD_SELECTOR
+
+
+MAPS_URL = 'https://www.google.com/maps'  # Replaced by the offline benchmark with its local fixture server
+WORKERS = 4  # Detail pages visited concurrently, overridable with --workers=N
+EXTRACTION_MODE = 'snapshot'  # 'snapshot' (one page.evaluate), 'locator' (one get_property per column) or 'payload' (place response)
+BLOCK_PROFILE = 'default'  # Request blocking profile from network.BLOCK_PROFILES, 'off' disables it
+LEASE_SECONDS = 300  # Lease of a term job claimed in --worker mode, renewed by a heartbeat
+KNOWN_STREAK = 60  # Cards in a row already in the seen-set that end the feed scroll
+SCROLL_STALLS = 2  # Scroll rounds without new cards (and no end-of-list marker) that end the feed scroll
+MIN_YIELD = 0.05  # Terms expected to yield fewer new records per card are deferred, overridable with --min-yield=N
+EXPLORE_RATE = 0.2  # Share of the runs in which a deferred term is re-checked, overridable with --explore=N
+REFRESH_LIMIT = 500  # Places revisited by a bare --refresh, overridable with --refresh=N
+RECYCLE_CARDS = 300  # Page loads (cards and feeds) before the browser context is recycled, overridable with --recycle-cards=N (0 disables)
+RECYCLE_RSS_MB = 1500  # Browser RSS (MB) that triggers a recycle, overridable with --recycle-rss=N (0 disables)
 
 PRODUCT_KEYWORDS = {
     'hotel': [
@@ -68,9 +96,22 @@ async def bypass_consent(page):
         pass
 
 
-async def collect_card_links(page):
-    # Collect business card links from the search results sidebar
-    cards = await page.locator('div.Nv2PK.THOPZb.CpccDe').all()
+async def collect_card_links(page, extraction=EXTRACTION_MODE):
+    # Collect business card links from the search results sidebar, in one evaluate unless extraction is 'locator'
+    if extraction != 'locator':
+        try:
+            with metrics.timer('card_harvest_seconds', path='evaluate'):
+                cards = await get_cards(page, CARD_SELECTOR)
+            if cards: return [card for card in cards if card['href']]
+        except Exception as e:
+            print(f'Bulk card harvest failed, falling back to locators: {e}')
+
+    with metrics.timer('card_harvest_seconds', path='locator'):
+        return await collect_card_links_locator(page)
+
+
+async def collect_card_links_locator(page):
+    cards = await page.locator(CARD_SELECTOR).all()
     card_data = []
     for card in cards:
         link_el = card.locator('a.hfpxzc')
@@ -87,200 +128,678 @@ async def collect_card_links(page):
     return card_data
 
 
-async def extract_details_from_modal(page, card, product_type):
-    await page.goto(card['href'])
-    await page.wait_for_timeout(1300)
-
-    name = await get_property(page, 'name')
-    if name is None: name = card['name_preview']
-
-    rating = await get_property(page, 'rating')
-
-    rating_count = await get_property(page, 'rating_count')
+async def extract_payload(page, capture, product_type):
+    # Columns decoded from the place payload received by the page, the missing ones are read from one DOM snapshot
+    props = parse_place(await capture.wait())
+    snapshot = None
+    for column in SNAPSHOT_COLUMNS:
+        if column == 'stars' and product_type != 'hotel': continue
+        source = 'payload' if props.get(column) is not None else 'dom'
+        if source == 'dom':
+            if snapshot is None: snapshot = await get_snapshot(page)
+            props[column] = snapshot.get(column)
+        metrics.increment('payload_fields_total', column=column, source=source)
 
-    lat, lon = await get_property(page, 'latitude'), await get_property(page, 'longitude')
+    return props
 
-    phone = await get_property(page, 'phone')
 
-    address = await get_property(page, 'address')
+async def extract_details_from_modal(page, card, product_type, extraction=EXTRACTION_MODE):
+    capture = capture_for(page) if extraction == 'payload' else None
+    if capture: capture.reset(parse_place_id(card['href']))
 
-    stars = None
-    if product_type == 'hotel': stars = await get_property(page, 'stars')
+    with metrics.timer('navigation_seconds'):
+        await page.goto(card['href'])
+    await wait_for_place(page)
 
-    img = await get_property(page, 'images')
+    if capture:
+        props = await extract_payload(page, capture, product_type)
+    elif extraction == 'snapshot':
+        props = await get_snapshot(page)
+    else:
+        props = {column: await get_property(page, column) for column in SNAPSHOT_COLUMNS if column != 'stars' or product_type == 'hotel'}
 
-    link = await get_property(page, 'link')
+    name = props.get('name')
+    if name is None: name = card['name_preview']
 
-    price = await get_property(page, 'price')
+    stars = props.get('stars') if product_type == 'hotel' else None
 
     desc = await get_property(page, 'description')
 
     facilities = await get_property(page, 'facilities')
     if facilities is None: facilities = card.get('facilities', [])
 
+    # Values already shown on the feed card cover the ones missing on the detail page
     res = {
         "name": name,
-        "rating": rating,
-        "rating_count": rating_count,
+        "rating": props.get('rating') or card.get('rating'),
+        "rating_count": props.get('rating_count') or card.get('rating_count'),
         "description": desc,
-        "images": img,
-        "link": link,
+        "images": props.get('images'),
+        "link": props.get('link'),
         "facilities": facilities,
-        "lat": lat,
-        "lon": lon,
-        "phone": phone,
-        "address": address,
-        "price": price,
+        "lat": props.get('latitude'),
+        "lon": props.get('longitude'),
+        "phone": props.get('phone'),
+        "address": props.get('address'),
+        "price": props.get('price') or card.get('price'),
         "stars": stars
     }
 
     return res
 
 
-async def process_search_term(page, db, product_type, location, search_term, max_results=None):
-    query = f"{search_term} {location}".replace(" ", "+")
-    url = f"https://www.google.com/maps/search/{query}/?hl=en&gl=us"
-    await page.goto(url)
-    await bypass_consent(page)
-    try:
-        await page.wait_for_selector('div[role="feed"]', timeout=8000)
-        await page.wait_for_timeout(1200)
-    except:
-        print('Something wrong, page not found... Moving on....')
-        return 0, 0
-
-    # Scroll to load more
-    feed = page.locator('div[role="feed"]')
-    stagnation = 0
-    prev_count = 0
-    max_attempts = 100
+def product_data(product_type, card, entry, cache=None, touch=True):
+    now = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+    db_data = {
+        'product_type': product_type,
+        'name': entry.get('name'),
+        'description': entry.get('description'),
+        'link': entry.get('link'),
+        'images': entry.get('images', None),
+        'rating': float(entry.get('rating') or 0),
+        'rating_count': entry.get('rating_count', 0),
+        'facilities': entry.get('facilities', None),
+        'latitude': entry.get('lat'),
+        'longitude': entry.get('lon'),
+        'phone': entry.get('phone'),
+        'address': entry.get('address'),
+        'price': entry.get('price'),
+        'card_href': card['href'],
+        'scraped_at': now,
+        'checked_at': now,
+        'check_failures': 0,
+        'partial': 0
+    }
 
-    print('Collecting cards...')
+    # The category is only shown on the feed card, a resumed card (href only) keeps the stored one
+    if card.get('category'): db_data['category'] = card['category']
+
+    if product_type.lower() == 'hotel' and 'stars' in entry:
+        db_data['stars'] = int(entry['stars']) if entry.get('stars') else None
+
+    # A place without its own description reuses the AI description already paid for, otherwise
+    # it is left empty so the upsert keeps the stored one instead of overwriting it with the placeholder
+    if cache and db_data['description'] in ('', None, PLACEHOLDER_DESCRIPTION):
+        db_data['description'] = cache.get(card['href'], touch)
+        # Without touch the cache hit is marked on the card and save_card updates it on the DB writer thread
+        if not touch: card['cached'] = db_data['description'] is not None
+
+    return db_data
+
+
+def refreshed_data(db_data):
+    # --refresh keeps the stored value of every column the detail page did not render, a page without any
+    # detail at all (closed or redirected place) is a failed check
+    if not any(db_data.get(column) for column in ('latitude', 'longitude', 'address', 'phone', 'link')):
+        raise ValueError('the place page rendered no details')
+    return {key: value for key, value in db_data.items() if value is not None and value != ''}
+
+
+def record_failed_check(db, product_type, card_href):
+    # A failed --refresh visit still counts as a check, so the place goes back to the end of the refresh queue
+    return db.execute(
+        "UPDATE products SET checked_at=?, check_failures=check_failures + 1 WHERE place_id=? AND product_type=?",
+        (time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()), parse_place_id(card_href), product_type)
+    )
+
+
+def card_data(product_type, card):
+    # --list-only record built from the feed card alone, marked partial until a deep pass visits the place.
+    # Values missing on the card are left out so they never erase the ones of a complete record
+    db_data = {
+        'product_type': product_type,
+        'name': card.get('name_preview'),
+        'rating': card.get('rating'),
+        'rating_count': card.get('rating_count'),
+        'price': card.get('price'),
+        'category': card.get('category'),
+        'card_href': card['href'],
+        'scraped_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+        'partial': 1
+    }
+    return {key: value for key, value in db_data.items() if value is not None}
 
-    for _ in range(max_attempts):
-        await feed.evaluate('el => {el.scrollTop = el.scrollHeight;}')
-        await page.wait_for_timeout(3000)
-        cards_now = await page.locator('div.Nv2PK.THOPZb.CpccDe').count()
-        if cards_now == prev_count:
-            stagnation += 1
-            if stagnation >= 3: break
+
+async def save_cards(cards, db, product_type, search_term, stats, jobs=None, writer=None):
+    # --list-only: every card is written straight from the feed, no detail page is opened
+    for card in cards:
+        if not await claim_card(card, product_type, stats, jobs, db, writer): continue
+        db_data = card_data(product_type, card)
+        if writer:
+            saved = await writer.submit(save_card, product_type, db_data, card, jobs)
+            saved.add_done_callback(lambda future: finish_card(saved_status(future), product_type, search_term, stats))
         else:
-            stagnation = 0
+            finish_card(save_card(db, product_type, db_data, card, jobs), product_type, search_term, stats)
 
-        prev_count = cards_now
-        if max_results and cards_now >= max_results:
-            break
 
-    card_links = await collect_card_links(page)
-    print(f'Cards collected: {len(card_links)}')
+def save_product(db, db_data):
+    # Runs on the DB writer thread when there is one, returns the status counted by finish_card
+    record_id, created = db.upsert(db_data)
+    if record_id is None: return 'failed'
 
-    total_to_process = min(max_results, len(card_links)) if max_results else len(card_links)
+    if created:
+        print(f"Business saved: {db_data['name']}")
+        return 'created'
+
+    print(f"Already exists: {db_data['name']}")
+    return 'updated'
+
+
+def save_card(db, product_type, db_data, card, jobs=None, cache=None):
+    # The record, the job bookkeeping and the cache hit of a card, in the same transaction on the DB writer thread
+    try: status = save_product(db, db_data)
+    except Exception as e:
+        print(f'Failed to save card: {e}')
+        status = 'failed'
+
+    if jobs: finish_jobs(db, product_type, card, status, jobs)
+    if cache and card.get('cached'): cache.touch([card['href']], db)
+    return status
+
+
+def fail_card(db, product_type, card, jobs=None):
+    # Bookkeeping of a card whose visit failed, runs on the DB writer thread when there is one
+    if jobs: finish_jobs(db, product_type, card, 'failed', jobs)
+    if card.get('refresh'): record_failed_check(db, product_type, card['href'])
+
+
+def mark_job(db, job_id, jobs, status='running'):
+    # Starts a card job (or finishes it with status), runs on the DB writer thread when there is one
+    if status == 'running': jobs.start(job_id, db)
+    else: jobs.finish(job_id, status, db)
+
+
+def finish_jobs(db, product_type, card, status, jobs):
+    # Closes the card job and, in --worker mode, keeps the place claim when it was visited or frees it for a retry
+    job_id = card.get('job_id')
+    if job_id: jobs.finish(job_id, 'failed' if status == 'failed' else 'done', db)
+    if jobs.worker_id:
+        if status == 'failed': jobs.release_place(product_type, parse_place_id(card['href']), db)
+        else: jobs.visited_place(product_type, parse_place_id(card['href']), db)
+
+
+def finish_card(status, product_type, search_term, stats):
+    # Counts the card once it is written (or failed), called back by the DB writer future
+    stats[status] += 1
+    metrics.increment('records_total', product_type=product_type, term=search_term, status=status)
+
+
+async def claim_card(card, product_type, stats, jobs=None, db=None, writer=None):
+    # In --worker mode the place is claimed in the shared DB right before its visit so no other machine
+    # visits it, the claim is tied to the term job whose lease covers the visit. The claim needs its answer
+    # now and stays on the event loop, the skipped job is written behind like the other job updates
+    if not jobs or not jobs.worker_id: return True
+    if jobs.claim_place(product_type, parse_place_id(card['href']), card.get('term_job_id')): return True
+
+    if card.get('job_id'):
+        if writer: await writer.submit(mark_job, card['job_id'], jobs, 'skipped')
+        else: mark_job(db, card['job_id'], jobs, 'skipped')
+    stats['skipped'] += 1
+    return False
 
-    card_times = []
-    start_total = time.time()
-    new_for_term = 0
-    updated_for_term = 0
 
-    for i, card in enumerate(card_links[:total_to_process], 1):
+def saved_status(future):
+    if future.cancelled() or future.exception(): return 'failed'
+    return future.result()
+
+
+async def card_worker(page, queue, db, product_type, search_term, stats, extraction=EXTRACTION_MODE, jobs=None, cache=None, writer=None):
+    # Consumes cards from the queue until it receives the stop signal (None). With a writer the record is
+    # written behind on its thread and the page moves on to the next card right away
+    while True:
+        item = await queue.get()
+        if item is None: break
+
+        i, card = item
+        if not await claim_card(card, product_type, stats, jobs, db, writer): continue
         card_start = time.time()
+        blocker = blocker_for(page)
+        blocked_before = blocker.snapshot() if blocker else None
+        job_id = card.get('job_id') if jobs else None
+        if job_id:
+            if writer: await writer.submit(mark_job, job_id, jobs)
+            else: mark_job(db, job_id, jobs)
         try:
-            entry = await extract_details_from_modal(page, card, product_type)
-            db_data = {
-                'product_type': product_type,
-                'name': entry.get('name'),
-                'description': entry.get('description'),
-                'link': entry.get('link'),
-                'images': entry.get('images', None),
-                'rating': float(entry.get('rating') or 0),
-                'rating_count': entry.get('rating_count', 0),
-                'facilities': entry.get('facilities', None),
-                'latitude': entry.get('lat'),
-                'longitude': entry.get('lon'),
-                'phone': entry.get('phone'),
-                'address': entry.get('address'),
-                'price': entry.get('price'),
-                'card_href': card['href']
-            }
-
-            if product_type.lower() == 'hotel' and 'stars' in entry:
-                db_data['stars'] = int(entry['stars']) if entry.get('stars') else None
-
-            existing = db.get(
-                "SELECT * FROM products WHERE name=? AND latitude=? AND longitude=? AND product_type=?",
-                (db_data["name"], db_data["latitude"], db_data["longitude"], db_data["product_type"])
-            )
-
-            if len(existing) > 0:
-                data = existing[0]
-
-                if db_data.get('description') == '' or db_data.get('description') is None:
-                    db_data['description'] = data.get('description')
-
-                db.update(data['id'], db_data)
-                updated_for_term += 1
-                print(f"Already exists: {db_data['name']}")
+            entry = await extract_details_from_modal(page, card, product_type, extraction)
+            db_data = product_data(product_type, card, entry, cache, touch=not writer)
+            if card.get('refresh'): db_data = refreshed_data(db_data)
+            if writer:
+                saved = await writer.submit(save_card, product_type, db_data, card, jobs, cache)
+                saved.add_done_callback(lambda future: finish_card(saved_status(future), product_type, search_term, stats))
             else:
-                db.create(db_data)
-                new_for_term += 1
-                print(f"Business saved: {entry.get('name')}")
+                finish_card(save_card(db, product_type, db_data, card, jobs), product_type, search_term, stats)
         except Exception as e:
             print(f'Failed to process card: {e}')
+            finish_card('failed', product_type, search_term, stats)
+            if writer: await writer.submit(fail_card, product_type, card, jobs)
+            else: fail_card(db, product_type, card, jobs)
 
-        card_end = time.time()
-        card_time = card_end - card_start
-        card_times.append(card_time)
+        card_time = time.time() - card_start
+        metrics.observe('card_seconds', card_time)
         print(f"Time spent for card {i}: {card_time:.2f} seconds")
+        if blocker: print(blocker.describe_since(blocked_before))
 
-    end_total = time.time()
-    total_time = end_total - start_total
-    if card_times:
-        avg_card_time = sum(card_times) / len(card_times)
-        print(f"\nAverage time per card: {avg_card_time:.2f} seconds")
 
-    print(f"Time spent for all cards: {total_time:.2f} seconds")
+async def load_feed(page, location, search_term, max_results=None, seen=None, extraction=EXTRACTION_MODE):
+    # Opens the search feed and scrolls it until the end of the list, returns None when the feed is not found
+    query = f"{search_term} {location}".replace(" ", "+")
+    url = f"{MAPS_URL}/search/{query}/?hl=en&gl=us"
+    await page.goto(url)
+    await bypass_consent(page)
+    if not await wait_for_feed(page):
+        return None
+
+    print('Collecting cards...')
 
+    # Each scroll returns as soon as the feed mutates, scrolling stops on the end-of-list marker, on max_results,
+    # after KNOWN_STREAK cards in a row that were already scraped or after SCROLL_STALLS rounds without new cards
+    start = time.time()
+    count = 0
+    known_streak = 0
+    stalls = 0
+    reason = 'max attempts'
+    for _ in range(100):
+        state = await scroll_feed(page, count)
+        for href in state['hrefs']:
+            known_streak = known_streak + 1 if seen and parse_place_id(href) in seen else 0
+        count = state['count']
+
+        if state['ended']: reason = 'end of list'
+        elif max_results and count >= max_results: reason = 'max results'
+        elif known_streak >= KNOWN_STREAK: reason = 'all known'
+        elif not state['changed']:
+            stalls += 1
+            if stalls < SCROLL_STALLS: continue
+            reason = 'stalled'
+        else:
+            stalls = 0
+            continue
+        break
+
+    scroll_time = time.time() - start
+    metrics.observe('scroll_seconds', scroll_time)
+    print(f"Scrolled {count} cards in {scroll_time:.2f} seconds ({count / scroll_time if scroll_time else 0:.1f} cards/second, stopped: {reason})")
+
+    return await collect_card_links(page, extraction)
+
+
+async def process_search_term(page, db, product_type, location, search_term, max_results=None, detail_pages=None, extraction=EXTRACTION_MODE, seen=None, jobs=None, cache=None, writer=None, list_only=False):
+    term_job = jobs.term_job(product_type, location, search_term) if jobs else None
+    if term_job: jobs.start(term_job['id'])
+
+    # Cards registered by an interrupted run are resumed straight from the jobs table. A --list-only
+    # term needs the card contents, not just the hrefs, so it reloads the feed and registers no card jobs
+    collected_jobs = jobs.card_jobs(product_type, location, search_term) if term_job and not list_only else []
+    if collected_jobs:
+        card_links = [
+            {'href': job['card_href'], 'name_preview': None, 'facilities': [], 'job_id': job['id']}
+            for job in jobs.card_jobs(product_type, location, search_term, unfinished_only=True)
+        ]
+        print(f'Resuming {len(card_links)} of {len(collected_jobs)} cards collected in a previous run')
+    else:
+        card_links = await load_feed(page, location, search_term, max_results, seen, extraction)
+        if card_links is None:
+            print('Something wrong, page not found... Moving on....')
+            if term_job: jobs.finish(term_job['id'], 'failed')
+            metrics.flush(product_type=product_type, location=location, term=search_term)
+            return 0, 0, 0
+
+        print(f'Cards collected: {len(card_links)}')
+
+        total_to_process = min(max_results, len(card_links)) if max_results else len(card_links)
+        card_links = card_links[:total_to_process]
+        if term_job and not list_only:
+            job_ids = jobs.enqueue_cards(product_type, location, search_term, [card['href'] for card in card_links])
+            for card in card_links: card['job_id'] = job_ids.get(card['href'])
+
+    total_to_process = len(card_links)
+
+    # Places already visited in this run (or still fresh in the DB) are skipped before navigation
+    if seen is None: seen = set()
+    pending_cards = []
+    for card in card_links:
+        place_id = parse_place_id(card['href'])
+        if place_id in seen:
+            if card.get('job_id'): jobs.finish(card['job_id'], 'skipped')
+            continue
+        seen.add(place_id)
+        if term_job: card['term_job_id'] = term_job['id']
+        pending_cards.append(card)
+
+    skipped_for_term = total_to_process - len(pending_cards)
+    if skipped_for_term:
+        print(f'Skipping {skipped_for_term} already seen cards ({skipped_for_term} page loads saved)')
+
+    stats = {'created': 0, 'updated': 0, 'failed': 0, 'skipped': 0}
+    start_total = time.time()
+
+    if list_only:
+        await save_cards(pending_cards, db, product_type, search_term, stats, jobs, writer)
+    else:
+        # Each detail page works as an independent worker fed by the same queue
+        if not detail_pages: detail_pages = [page]
+        queue = asyncio.Queue()
+        for i, card in enumerate(pending_cards, 1):
+            queue.put_nowait((i, card))
+        for _ in detail_pages:
+            queue.put_nowait(None)
+
+        await asyncio.gather(*[card_worker(detail_page, queue, db, product_type, search_term, stats, extraction, jobs, cache, writer) for detail_page in detail_pages])
+    if writer: await writer.drain()
+
+    total_time = time.time() - start_total
+    for _, card_times in metrics.series('card_seconds'):
+        print(f"\nAverage time per card: {card_times['sum'] / card_times['count']:.2f} seconds (p90 {metrics.quantile(card_times, 0.9):.2f})")
+        if total_time > 0:
+            print(f"Throughput: {card_times['count'] / total_time * 60:.1f} cards/minute ({len(detail_pages)} workers)")
+    if list_only: print(f"List-only records written: {stats['created'] + stats['updated']}")
+    if stats['skipped']: print(f"Cards claimed by other workers (skipped): {stats['skipped']}")
+
+    print(f"Time spent for all cards: {total_time:.2f} seconds")
+    print_wait_summary()
+    metrics.print_summary(['getter_seconds', 'selector_timeouts_total'])
+    metrics.observe('term_seconds', total_time)
+    print(memory.describe_rss(*memory.record_rss()))
+    metrics.flush(product_type=product_type, location=location, term=search_term)
+
+    new_for_term = stats['created']
+    updated_for_term = stats['updated']
+    skipped_for_term += stats['skipped']
     print(f"New records for term '{search_term}': {new_for_term}")
     print(f"Updated records for term '{search_term}': {updated_for_term}")
-    return new_for_term, updated_for_term
+
+    if term_job:
+        jobs.finish(term_job['id'], 'done')
+        jobs.print_summary(product_type, location)
+
+    return new_for_term, updated_for_term, skipped_for_term
+
+
+def load_fresh_places(db, product_type, fresh_days, list_only=False):
+    # Place ids seen in the last fresh_days days, used to preload the seen-set. A full run only skips the places
+    # whose detail page was visited (checked_at), a --list-only pass over a row does not make it fresh.
+    # Another --list-only run skips every row written recently (scraped_at)
+    if not fresh_days: return set()
+
+    column = 'scraped_at' if list_only else 'checked_at'
+    fresh = db.get(
+        f"SELECT card_href FROM products WHERE product_type=? AND {column} >= datetime('now', ?)",
+        (product_type, f'-{fresh_days} days')
+    )
+    seen = {parse_place_id(row['card_href']) for row in fresh}
+    print(f"Places of type {product_type} {'seen' if list_only else 'checked'} in the last {fresh_days} days (skipped): {len(seen)}")
+    return seen
+
+
+async def refresh_places(rows, db, detail_pages, extraction=EXTRACTION_MODE, cache=None, writer=None):
+    # --refresh: revisits the given records directly by href, no search feed is loaded. A column missing on
+    # the detail page keeps its stored value (refreshed_data) and a failed visit is recorded as a failed check
+    stats = {'created': 0, 'updated': 0, 'failed': 0}
+    start_total = time.time()
+
+    by_type = {}
+    for row in rows:
+        by_type.setdefault(row['product_type'], []).append({
+            'href': row['card_href'], 'name_preview': row['name'], 'facilities': [], 'rating': row['rating'],
+            'rating_count': row['rating_count'], 'price': row['price'], 'category': row['category'], 'refresh': True
+        })
+
+    for product_type, cards in by_type.items():
+        print(f"\nRefreshing {len(cards)} places of type {product_type}")
+        queue = asyncio.Queue()
+        for i, card in enumerate(cards, 1):
+            queue.put_nowait((i, card))
+        for _ in detail_pages:
+            queue.put_nowait(None)
+
+        await asyncio.gather(*[card_worker(detail_page, queue, db, product_type, 'refresh', stats, extraction, None, cache, writer) for detail_page in detail_pages])
+    if writer: await writer.drain()
+
+    total_time = time.time() - start_total
+    print(f"\nPlaces refreshed: {stats['created'] + stats['updated']}, failed: {stats['failed']} in {total_time:.2f} seconds")
+    print_wait_summary()
+    metrics.observe('term_seconds', total_time)
+    print(memory.describe_rss(*memory.record_rss()))
+    metrics.flush(term='refresh')
+    return stats['created'], stats['updated'], 0
+
+
+def plan_terms(scheduler, product_type, location, search_terms):
+    # Orders the terms by expected yield, the deferred ones are recorded so the explore quota picks them up later
+    if not scheduler: return search_terms, []
+
+    planned, deferred = scheduler.plan(product_type, location, search_terms)
+    scheduler.defer(product_type, location, deferred)
+    scheduler.print_plan(product_type, location, planned, deferred)
+    return planned, deferred
+
+
+def run_coordinator(jobs, product_types, locations, scheduler=None, mode='full'):
+    # Expands every product type x location x keyword into term jobs that workers claim from the shared DB,
+    # enqueued by expected yield since workers claim them in insertion order
+    for product_type in product_types:
+        jobs.clear_place_claims(product_type)
+        for location in locations:
+            search_terms, _ = plan_terms(scheduler, product_type, location, [product_type] + PRODUCT_KEYWORDS.get(product_type, []))
+            jobs.reset(product_type, location)
+            jobs.enqueue_terms(product_type, location, search_terms, mode)
+            print(f"Enqueued {len(search_terms)} terms for {product_type} / {location}")
+
+    jobs.print_summary()
+
+
+async def heartbeat(jobs, job_id, lease_seconds, term):
+    # Cancels the term when the lease is lost, another worker may already be processing it
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        if not jobs.renew(job_id, lease_seconds):
+            print(f"Lease lost for job {job_id}, cancelling the term")
+            term.cancel()
+            return
+
+
+async def run_worker(session, db, jobs, max_results, extraction, fresh_days, lease_seconds, cache=None, scheduler=None, writer=None, list_only=False):
+    # Claims term jobs until none is left, the lease is renewed while the term is processed. The pages are
+    # read from the session on every term, they are replaced when the session recycles the context
+    totals = [0, 0, 0]
+    seen_by_type = {}
+    while True:
+        unit = jobs.claim_term(lease_seconds)
+        if unit is None:
+            if not jobs.has_unfinished_terms(): break
+            # Remaining terms are leased by other workers, wait in case one of them dies
+            await asyncio.sleep(lease_seconds / 3)
+            continue
+
+        product_type, location, search_term = unit['product_type'], unit['location'], unit['search_term']
+        if product_type not in seen_by_type:
+            seen_by_type[product_type] = load_fresh_places(db, product_type, fresh_days, list_only)
+
+        print(f"\n[{jobs.worker_id}] Processing: {search_term} ({product_type} / {location})")
+        term = asyncio.create_task(process_search_term(session.page, db, product_type, location, search_term, max_results, session.detail_pages, extraction, seen_by_type[product_type], jobs, cache, writer, list_only))
+        beat = asyncio.create_task(heartbeat(jobs, unit['id'], lease_seconds, term))
+        try:
+            result = await term
+            totals = [total + value for total, value in zip(totals, result)]
+            if scheduler: scheduler.record(product_type, location, search_term, result[0], sum(result))
+        except asyncio.CancelledError:
+            # Only a lost lease is absorbed here, any other cancellation (Ctrl-C) stops the worker
+            if not beat.done() or beat.cancelled(): raise
+            jobs.release_places(unit['id'])
+            result = (0, 0, 0)
+        except Exception as e:
+            print(f'Failed to process term, releasing it: {e}')
+            jobs.release(unit['id'])
+            result = (0, 0, 0)
+        finally:
+            beat.cancel()
+
+        await session.after_term()
+
+    return totals
+
+
+def create_scheduler(db):
+    # --all-terms runs every keyword in the fixed PRODUCT_KEYWORDS order, without the yield history
+    if get_option('all-terms'): return None
+    return TermScheduler(db, get_option('min-yield', MIN_YIELD, float), get_option('explore', EXPLORE_RATE, float))
 
 
 async def main():
     allowed_types = ['hotel', 'gastronomy', 'attraction', 'shopping', 'activity']
+    positional = get_positional()
     def get_param(idx, prompt):
         try:
-            value = sys.argv[idx]
+            value = positional[idx - 1]
             if not value.strip(): raise ValueError
             return value
         except (IndexError, ValueError):
             return input(prompt)
 
-    product_type = get_param(1, "Enter product type (hotel, gastronomy, attraction, shopping, activity): ")
-    if product_type not in allowed_types:
-        print("Invalid product type")
+    # A DB shared between machines (e.g. on a network mount) should use --journal-mode=DELETE, WAL needs shared memory
+    db_path = get_option('db', 'products.db')
+    journal_mode = get_option('journal-mode', 'WAL')
+
+    if get_option('progress'):
+        JobManager(DatabaseManager(db_path, journal_mode=journal_mode)).print_summary()
+        return
+
+    if get_option('coordinator'):
+        # Usage: --coordinator <product types, comma separated or "all"> <location> [<location> ...]
+        types_param = get_param(1, "Enter product types (comma separated or all): ")
+        product_types = allowed_types if types_param == 'all' else types_param.split(',')
+        locations = positional[1:] or [get_param(2, "Enter location (city/state/country): ")]
+        if any(product_type not in allowed_types for product_type in product_types):
+            print("Invalid product type")
+            exit(1)
+
+        db = DatabaseManager(db_path, persistent=True, journal_mode=journal_mode)
+        run_coordinator(JobManager(db), product_types, locations, create_scheduler(db), 'list-only' if get_option('list-only') else 'full')
+        db.close()
+        return
+
+    worker_mode = get_option('worker')
+    max_results = get_option('max-results', None, int)
+    workers = get_option('workers', WORKERS, int)
+    extraction = get_option('extraction', EXTRACTION_MODE)
+    fresh_days = get_option('fresh-days', None, float)
+    lease_seconds = get_option('lease', LEASE_SECONDS, float)
+    block_profile = get_option('block-profile', BLOCK_PROFILE)
+    # Feed cards only (name, rating, reviews, category, price, href), saved as partial for a later deep pass
+    list_only = get_option('list-only')
+    # Long runs recycle the browser context (--recycle-browser: the whole browser) to keep Chromium memory flat
+    recycle_cards = get_option('recycle-cards', RECYCLE_CARDS, int)
+    recycle_rss_mb = get_option('recycle-rss', RECYCLE_RSS_MB, float)
+    recycle_browser = get_option('recycle-browser', False)
+    metrics.configure(get_option('metrics-jsonl'), get_option('metrics-prom'))
+    if block_profile not in BLOCK_PROFILES:
+        print(f"Invalid block profile, use one of: {', '.join(BLOCK_PROFILES)}")
         exit(1)
 
-    location = get_param(2, "Enter location (city/state/country): ")
-    max_results = None # You may parametrize it
-    db = DatabaseManager()
-    search_terms = [product_type] + PRODUCT_KEYWORDS.get(product_type, [])
+    db = DatabaseManager(db_path, persistent=True, journal_mode=journal_mode)
+    cache = DescriptionCache(db, PROMPT_VERSION)
+    scheduler = create_scheduler(db)
+
+    # Usage: --refresh=N [product type] [--by-popularity], revisits the N places checked longest ago
+    refresh = get_option('refresh', None, int)
+    if refresh is True: refresh = REFRESH_LIMIT
+
+    if worker_mode:
+        jobs = JobManager(db, worker_id=get_option('worker-id', f"{socket.gethostname()}-{os.getpid()}"))
+        print(f"Worker {jobs.worker_id} started")
+    elif refresh:
+        product_type = get_positional()[0] if get_positional() else None
+        if product_type and product_type not in allowed_types:
+            print("Invalid product type")
+            exit(1)
+
+        refresher = RefreshScheduler(db, popularity=get_option('by-popularity', False))
+        refresh_rows = refresher.stalest(refresh, product_type)
+        refresher.print_plan(refresh_rows)
+    else:
+        product_type = get_param(1, "Enter product type (hotel, gastronomy, attraction, shopping, activity): ")
+        if product_type not in allowed_types:
+            print("Invalid product type")
+            exit(1)
+
+        location = get_param(2, "Enter location (city/state/country): ")
+        search_terms = [product_type] + PRODUCT_KEYWORDS.get(product_type, [])
+
+        # Picks up only the unfinished terms of an interrupted run. A finished run first retries its failed
+        # cards (their terms are reopened), only a run with nothing left to retry (or --restart) starts over
+        # A --list-only run and a full run do not share progress: a term done from the feed alone still
+        # needs its detail pages, so a change of mode starts over
+        jobs = JobManager(db)
+        mode = 'list-only' if list_only else 'full'
+        restart = get_option('restart')
+        previous_mode = jobs.run_mode(product_type, location)
+        if previous_mode and previous_mode != mode:
+            print(f"Previous run was {previous_mode}, starting a new {mode} run")
+            restart = True
+        retried = []
+        if not restart and not jobs.unfinished_terms(product_type, location):
+            retried = jobs.reopen_failed_terms(product_type, location)
+            if retried: print(f"Retrying the failed cards of {len(retried)} terms of the previous run")
+        if restart or not jobs.unfinished_terms(product_type, location):
+            jobs.reset(product_type, location)
+            retried = []
+        jobs.enqueue_terms(product_type, location, search_terms, mode)
+        unfinished = [job['search_term'] for job in jobs.unfinished_terms(product_type, location)]
+        if len(unfinished) < len(search_terms) and not retried:
+            print(f"Resuming previous run: {len(unfinished)} of {len(search_terms)} terms left")
+
+        # Retried terms reuse their collected cards, there is no feed to save by deferring them
+        if retried: search_terms = unfinished
+        else:
+            search_terms, deferred = plan_terms(scheduler, product_type, location, unfinished)
+            for search_term in deferred:
+                jobs.finish(jobs.term_job(product_type, location, search_term)['id'], 'skipped')
+
+        # Places already done by the resumed run are not visited again, even without --fresh-days
+        seen = load_fresh_places(db, product_type, fresh_days, list_only)
+        seen |= {parse_place_id(card_href) for card_href in jobs.done_places(product_type, location)}
 
     new_total = 0
     updated_total = 0
+    skipped_total = 0
+
+    # Product records are written behind by the writer thread, --sync-writes keeps them on the event loop
+    writer = None if get_option('sync-writes') else DatabaseWriter(db_path, journal_mode).start()
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context()
-        page = await context.new_page()
-        print(f"Total search terms: {len(search_terms)}")
-        for search_term in search_terms:
-            print(f"\nProcessing: {search_term}")
-            new_for_term, updated_for_term = await process_search_term(page, db, product_type, location, search_term, max_results)
-            new_total += new_for_term
-            updated_total += updated_for_term
-        await browser.close()
+        session = await BrowserSession(p, workers, block_profile, recycle_cards, recycle_rss_mb, recycle_browser).start()
+
+        try:
+            if worker_mode:
+                new_total, updated_total, skipped_total = await run_worker(session, db, jobs, max_results, extraction, fresh_days, lease_seconds, cache, scheduler, writer, list_only)
+            elif refresh:
+                # Refreshed in batches of --recycle-cards places, so the session can recycle between them
+                batch_size = recycle_cards or len(refresh_rows) or 1
+                for start in range(0, len(refresh_rows), batch_size):
+                    result = await refresh_places(refresh_rows[start:start + batch_size], db, session.detail_pages, extraction, cache, writer)
+                    new_total, updated_total = new_total + result[0], updated_total + result[1]
+                    await session.after_term()
+            else:
+                print(f"Total search terms: {len(search_terms)}")
+                for search_term in search_terms:
+                    print(f"\nProcessing: {search_term}")
+                    new_for_term, updated_for_term, skipped_for_term = await process_search_term(session.page, db, product_type, location, search_term, max_results, session.detail_pages, extraction, seen, jobs, cache, writer, list_only)
+                    if scheduler and not retried: scheduler.record(product_type, location, search_term, new_for_term, new_for_term + updated_for_term + skipped_for_term)
+                    new_total += new_for_term
+                    updated_total += updated_for_term
+                    skipped_total += skipped_for_term
+                    await session.after_term()
+        finally:
+            # Flushes the queued records even when the run is interrupted (Ctrl-C)
+            if writer: writer.close()
+        await session.close()
+    db.close()
 
     print(f"\nTotal new records: {new_total}")
     print(f"Total updated records: {updated_total}")
+    print(f"Total page loads saved by dedup: {skipped_total}")
+    print(f"Browser recycles: {session.recycles}")
+    cache.print_stats()
 
 
 if __name__ == "__main__":
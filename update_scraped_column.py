@@ -1,48 +1,165 @@
 import asyncio
-import sys
+import time
+import metrics
 from playwright.async_api import async_playwright
 from DatabaseManager import DatabaseManager
-from getters import get_property
+from DatabaseWriter import DatabaseWriter
+from getters import get_property, get_snapshot, COLUMNS, SNAPSHOT_COLUMNS
+from network import attach_blocker
+from options import get_option, get_positional
+from readiness import wait_for_place
+
+
+WORKERS = 4  # Pages loading rows concurrently, overridable with --workers=N
+BATCH_SIZE = 50  # Rows written per transaction by the DB writer, overridable with --batch=N
+CHUNK_SIZE = 500  # Rows read per fetchmany, overridable with --chunk=N
+
+
+def is_missing(value):
+    return value is None or value == ''
+
+
+async def scrape_missing(page, row, columns):
+    # One navigation per row, every missing column is extracted from the same page load. Returns None when the
+    # place did not load: the pooled page would still show the previous row and its values would be written here
+    missing = [column for column in columns if is_missing(row.get(column))]
+
+    try:
+        await page.goto(row.get('card_href'))
+        if not await wait_for_place(page): return None
+    except Exception: return None
+
+    scraped = {}
+    if any(column in SNAPSHOT_COLUMNS for column in missing):
+        snapshot = await get_snapshot(page)
+        scraped.update({column: snapshot[column] for column in missing if column in SNAPSHOT_COLUMNS})
+
+    for column in missing:
+        if column not in SNAPSHOT_COLUMNS: scraped[column] = await get_property(page, column)
+
+    return scraped
+
+
+def count_written(stats):
+    def done(future):
+        if not future.cancelled() and not future.exception() and future.result(): stats['written'] += 1
+    return done
+
+
+async def row_worker(page, queue, writer, columns, stats, complete_partial=False):
+    blocker = await attach_blocker(page)
+    while True:
+        row = await queue.get()
+        if row is None: break
+
+        blocked_before = blocker.snapshot() if blocker else None
+        try:
+            scraped = await scrape_missing(page, row, columns)
+        except Exception as e:
+            print(f"Failed to update {row.get('id')}: {e}")
+            continue
+        if scraped is None:
+            print(f"Place page of {row.get('id')} did not load, skipped")
+            stats['failed'] += 1
+            continue
+
+        # Only the values actually found are written, the others stay missing for a later run
+        found = {column: value for column, value in scraped.items() if not is_missing(value)}
+        print(f"updating {row.get('id')}: {found}")
+        if blocker: print(blocker.describe_since(blocked_before))
+        stats['rows'] += 1
+        # A --partial row whose place page loaded stops being partial even with gaps left
+        if complete_partial: found.update(partial=0, checked_at=time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+        if not found: continue
+
+        # Written behind by the DB writer thread, the page loads the next row right away
+        saved = await writer.submit(DatabaseManager.update, row.get('id'), found)
+        saved.add_done_callback(count_written(stats))
+
+
+async def feed_rows(db, sql, params, queue, workers, chunk_size):
+    # Streams the rows into the bounded queue, the workers are never more than a queue ahead of the DB reads.
+    # Each chunk is a new query (iter_pages), an open read cursor would pin the WAL checkpoint while the
+    # writer thread commits and the -wal file would grow for the whole run
+    for row in db.iter_pages(sql, params, chunk_size):
+        await queue.put(row)
+    for _ in range(workers):
+        await queue.put(None)
 
 
 async def main():
+    positional = get_positional()
     try:
-        column = sys.argv[1]
-        product_type = sys.argv[2] if len(sys.argv) > 2 else None
-    except:
-        column = input('Inform the column you want to update: ')
+        columns_param = positional[0]
+        product_type = positional[1] if len(positional) > 1 else None
+    except IndexError:
+        columns_param = input('Inform the columns you want to update (comma separated): ')
         product_type = input('Inform the product type you want to update (Empty for all): ')
 
+    # Column names go straight into the SQL, so only the ones supported by the getters are accepted
+    if columns_param.strip() == 'all': columns_param = ','.join(COLUMNS)
+    columns = [column.strip() for column in columns_param.split(',') if column.strip()]
+    invalid = [column for column in columns if column not in COLUMNS]
+    if not columns or invalid:
+        print(f"Column not supported: {', '.join(invalid)}. Use: {', '.join(COLUMNS)}")
+        exit()
+
     if product_type and product_type not in ['hotel', 'gastronomy', 'attraction', 'shopping', 'activity']:
         print('Product type not supported...')
         exit()
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        db = DatabaseManager()
+    workers = max(get_option('workers', WORKERS, int), 1)
+    batch_size = get_option('batch', BATCH_SIZE, int)
+    # Deep pass over the records saved by the scraper's --list-only mode: python update_scraped_column.py all --partial
+    # Only a pass over every column completes the rows, with some columns the rows stay partial
+    partial = get_option('partial')
+    complete_partial = partial and set(columns) == set(COLUMNS)
+    if partial and not complete_partial: print('Not every column was given, the rows stay partial')
+    metrics.configure(get_option('metrics-jsonl'), get_option('metrics-prom'))
+    db = DatabaseManager(persistent=True)
 
-        sql = f"SELECT * FROM products WHERE ({column}='' OR {column} IS NULL)"
-        params = []
-        if product_type:
-            sql += " AND product_type=?"
-            params.append(product_type)
+    missing_clause = ' OR '.join([f"{column}='' OR {column} IS NULL" for column in columns])
+    where = "partial = 1" if complete_partial else f"({missing_clause})"
+    if partial and not complete_partial: where += " AND partial = 1"
+    where += " AND card_href IS NOT NULL"
+    params = []
+    if product_type:
+        where += " AND product_type=?"
+        params.append(product_type)
 
-        results = db.get(sql, params)
+    count = db.get(f"SELECT COUNT(*) AS total FROM products WHERE {where}", params)
+    described = 'Partial rows' if partial else f"Rows missing {', '.join(columns)}"
+    print(f"{described}: {count[0]['total'] if count else 0}")
 
-        for result in results:
-            url = result.get('card_href')
+    # Rows are read in chunks while the workers run, memory stays flat on databases with millions of rows
+    sql = f"SELECT * FROM products WHERE {where}"
+    queue = asyncio.Queue(maxsize=workers * 2)
 
-            try: await page.goto(url)
-            except: pass
+    stats = {'rows': 0, 'written': 0, 'failed': 0}
+    writer = DatabaseWriter(batch_size=batch_size).start()
+    start = time.time()
 
-            scraped = await get_property(page, column)
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        pages = [await browser.new_page() for _ in range(workers)]
 
-            print(f'updating {result.get('id')}: {column} = {scraped}')
-            db.update(result.get('id'), {column: scraped})
+        try:
+            await asyncio.gather(
+                feed_rows(db, sql, params, queue, workers, get_option('chunk', CHUNK_SIZE, int)),
+                *[row_worker(page, queue, writer, columns, stats, complete_partial) for page in pages]
+            )
+            await writer.drain()
+        finally:
+            # Flushes the queued updates even when the run is interrupted (Ctrl-C)
+            writer.close()
 
         await browser.close()
         print('Closing browser...')
 
+    db.close()
+    print(f"Rows visited: {stats['rows']}, rows updated: {stats['written']}, not loaded: {stats['failed']} in {time.time() - start:.2f} seconds")
+    metrics.print_summary()
+    metrics.flush(columns=columns, product_type=product_type)
+
 
 asyncio.run(main())